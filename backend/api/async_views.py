@@ -0,0 +1,211 @@
+"""Асинхронные представления чтения Рецептов, Тэгов и Ингредиентов.
+
+В режиме ASGI (SERVER_MODE=asgi) GET-запросы к спискам и объектам этих
+ресурсов обрабатываются корутинами: справочники читаются асинхронным
+ORM, а ответы на анонимные запросы к Рецептам берутся из кэша без
+обращения к базе. Пока запрос ждёт базу, воркер обслуживает другие
+запросы. Остальные запросы, а также промахи кэша и запросы
+авторизованных Пользователей передаются вьюсетам DRF в пуле потоков,
+поэтому формат ответов в обоих режимах одинаков.
+"""
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.urls import URLPattern
+from django.utils.cache import quote_etag
+from django.utils.decorators import method_decorator
+from django.utils.http import parse_http_date
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from .cache import aget_detail_key, aget_list_key
+from .constants import INGREDIENT_SEARCH_LIMIT
+from .ingredient_index import ingredient_index
+from .mixins import aconditional_response, conditional_response
+from recipes.models import CatalogVersion, Ingredient, Tag
+
+
+def render_json(data, status_code=status.HTTP_200_OK):
+    """Ответ с JSON, совпадающим с выводом JSONRenderer в DRF."""
+    return HttpResponse(
+        JSONRenderer().render(data),
+        content_type='application/json',
+        status=status_code
+    )
+
+
+def close_connection_after(func, *args):
+    """Вызывает func и закрывает соединение с БД текущего потока.
+
+    Потоки пула sync_to_async(thread_sensitive=False) не получают
+    сигналов запроса, поэтому открытое при перестроении индекса
+    соединение иначе осталось бы висеть.
+    """
+    try:
+        return func(*args)
+    finally:
+        connection.close()
+
+
+async def call_index(func, *args):
+    """Вызов индекса Ингредиентов в пуле потоков.
+
+    Индекс не зависит от потока, поэтому вызовы не ждут общего потока
+    синхронных вьюсетов, в котором выполняются промахи кэша.
+    """
+    return await sync_to_async(
+        close_connection_after, thread_sensitive=False
+    )(func, *args)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncReadView(View):
+    """GET-запросы обрабатываются корутиной get, остальные — sync_view."""
+    sync_view = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await self.call_sync_view(request, *args, **kwargs)
+        return await self.get(request, *args, **kwargs)
+
+    async def call_sync_view(self, request, *args, **kwargs):
+        return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+
+class AsyncCatalogView(AsyncReadView):
+    """Список или объект справочника с ответом 304 по версии."""
+    model = None
+    fields = ()
+
+    async def get_validators(self):
+        """Возвращает значение ETag и дату последнего изменения."""
+        raise NotImplementedError
+
+    async def get(self, request, **kwargs):
+        etag, last_modified = await self.get_validators()
+        return await aconditional_response(
+            request, quote_etag(etag), int(last_modified.timestamp()),
+            partial(self.get_response, request, kwargs.get('pk'))
+        )
+
+    async def get_response(self, request, pk):
+        queryset = self.model.objects.values(*self.fields)
+        if pk is None:
+            return render_json([item async for item in queryset])
+        try:
+            item = await queryset.filter(pk=pk).afirst()
+        except (TypeError, ValueError):
+            item = None
+        if item is None:
+            return render_json(
+                {'detail': f'No {self.model._meta.object_name} matches '
+                           f'the given query.'},
+                status.HTTP_404_NOT_FOUND
+            )
+        return render_json(item)
+
+
+class AsyncTagsView(AsyncCatalogView):
+    """Асинхронное чтение Тэгов."""
+    model = Tag
+    fields = ('id', 'name', 'slug')
+
+    async def get_validators(self):
+        catalog, _ = await CatalogVersion.objects.aget_or_create(
+            name=CatalogVersion.TAGS
+        )
+        return f'tags-{catalog.version}', catalog.updated_at
+
+
+class AsyncIngredientsView(AsyncCatalogView):
+    """Асинхронное чтение Ингредиентов.
+
+    Поиск по префиксу выполняется по индексу в памяти в пуле потоков,
+    чтобы нечёткий поиск не задерживал цикл событий и общий поток
+    синхронных вьюсетов; запросы с параметром search передаются
+    вьюсету.
+    """
+    model = Ingredient
+    fields = ('id', 'name', 'measurement_unit')
+
+    async def get(self, request, **kwargs):
+        if 'search' in request.GET:
+            return await self.call_sync_view(request, **kwargs)
+        return await super().get(request, **kwargs)
+
+    async def get_validators(self):
+        snapshot = await call_index(ingredient_index.refresh)
+        return f'ingredients-{snapshot.version}', snapshot.updated_at
+
+    async def get_response(self, request, pk):
+        name = request.GET.get('name')
+        if pk is not None or not name:
+            return await super().get_response(request, pk)
+        return render_json(await call_index(
+            self.search, name, request.GET.get('fuzzy') == '1'
+        ))
+
+    @staticmethod
+    def search(name, fuzzy):
+        """Поиск по префиксу, а если ничего не найдено — нечёткий."""
+        ingredients = []
+        if not fuzzy:
+            ingredients = ingredient_index.search(
+                name, INGREDIENT_SEARCH_LIMIT
+            )
+        if not ingredients:
+            ingredients = ingredient_index.fuzzy_search(
+                name, INGREDIENT_SEARCH_LIMIT
+            )
+        return ingredients
+
+
+class AsyncRecipesView(AsyncReadView):
+    """Анонимное чтение Рецептов из кэша ответов.
+
+    Ответ и его валидаторы кэширует вьюсет при первом запросе, поэтому
+    повторные запросы обслуживаются без базы и без потока.
+    """
+
+    async def get(self, request, **kwargs):
+        if 'HTTP_AUTHORIZATION' in request.META:
+            return await self.call_sync_view(request, **kwargs)
+        key = (await aget_detail_key(request, kwargs['pk']) if 'pk' in kwargs
+               else await aget_list_key(request))
+        cached = await cache.aget(key)
+        if cached is None:
+            return await self.call_sync_view(request, **kwargs)
+        data, etag, last_modified = cached
+        if last_modified is not None:
+            last_modified = parse_http_date(last_modified)
+        return conditional_response(
+            request, etag, last_modified, partial(render_json, data)
+        )
+
+
+ASYNC_READ_VIEWS = {
+    'recipes-list': AsyncRecipesView,
+    'recipes-detail': AsyncRecipesView,
+    'tags-list': AsyncTagsView,
+    'tags-detail': AsyncTagsView,
+    'ingredients-list': AsyncIngredientsView,
+    'ingredients-detail': AsyncIngredientsView,
+}
+
+
+def get_async_urls(urls):
+    """Маршруты роутера, в которых чтение заменено корутинами."""
+    return [
+        URLPattern(
+            url.pattern,
+            ASYNC_READ_VIEWS[url.name].as_view(sync_view=url.callback),
+            url.default_args,
+            url.name
+        ) if url.name in ASYNC_READ_VIEWS else url
+        for url in urls
+    ]
@@ -0,0 +1,109 @@
+"""Кэш ответов на анонимные запросы к Рецептам.
+
+Ключи ответов содержат номера версий. Версия списка меняется при любом
+изменении Рецептов, версия Рецепта — при изменении этого Рецепта, а
+версия справочников — при изменении Тэгов, Ингредиентов и Пользователей.
+Инвалидация сводится к увеличению нужной версии. Сигналы увеличивают
+версии после фиксации транзакции: иначе параллельный промах кэша
+прочитал бы ещё не изменённые данные и сохранил их под новой версией.
+"""
+import time
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+
+LIST_VERSION_KEY = 'recipes:list:version'
+CATALOG_VERSION_KEY = 'recipes:catalog:version'
+RECIPE_VERSION_KEY = 'recipes:{pk}:version'
+
+
+def get_version(key):
+    """Возвращает текущую версию, создавая её при отсутствии."""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(key):
+    """Асинхронный вариант get_version для корутин."""
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(key):
+    """Увеличивает версию, делая устаревшими все ключи с ней."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def invalidate_recipe(pk):
+    """Инвалидация ответов, содержащих Рецепт."""
+    bump_version(RECIPE_VERSION_KEY.format(pk=pk))
+    bump_version(LIST_VERSION_KEY)
+
+
+def invalidate_catalog():
+    """Инвалидация всех ответов на запросы к Рецептам."""
+    bump_version(CATALOG_VERSION_KEY)
+    bump_version(LIST_VERSION_KEY)
+
+
+def format_list_key(request, version):
+    """Ключ ответа на запрос списка по нормализованным параметрам."""
+    params = urlencode(sorted(
+        (key, value)
+        for key, values in request.GET.lists()
+        for value in values
+    ))
+    return 'recipes:list:{version}:{host}:{params}'.format(
+        version=version,
+        host=request.get_host(),
+        params=md5(params.encode()).hexdigest(),
+    )
+
+
+def format_detail_key(request, pk, catalog, version):
+    """Ключ ответа на запрос Рецепта с учётом параметра renditions."""
+    return 'recipes:{pk}:{catalog}:{version}:{host}:{renditions}'.format(
+        pk=pk,
+        catalog=catalog,
+        version=version,
+        host=request.get_host(),
+        renditions=request.GET.get('renditions') == '1',
+    )
+
+
+def get_list_key(request):
+    """Ключ ответа на запрос списка."""
+    return format_list_key(request, get_version(LIST_VERSION_KEY))
+
+
+def get_detail_key(request, pk):
+    """Ключ ответа на запрос Рецепта."""
+    return format_detail_key(
+        request, pk,
+        get_version(CATALOG_VERSION_KEY),
+        get_version(RECIPE_VERSION_KEY.format(pk=pk))
+    )
+
+
+async def aget_list_key(request):
+    """Ключ ответа на запрос списка без блокирующих вызовов кэша."""
+    return format_list_key(request, await aget_version(LIST_VERSION_KEY))
+
+
+async def aget_detail_key(request, pk):
+    """Ключ ответа на запрос Рецепта без блокирующих вызовов кэша."""
+    return format_detail_key(
+        request, pk,
+        await aget_version(CATALOG_VERSION_KEY),
+        await aget_version(RECIPE_VERSION_KEY.format(pk=pk))
+    )
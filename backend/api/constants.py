@@ -6,3 +6,25 @@ RECIPE_IS_IN = (
     (1, 'is_in'),
 )
 PAGINATION_PAGE_SIZE = 6
+CURSOR_PAGINATION_ORDERING = '-id'
+SEARCH_CONFIG = 'russian'
+INGREDIENT_INDEX_RECHECK_SECONDS = 5
+INGREDIENT_SEARCH_LIMIT = 50
+FUZZY_SIMILARITY_THRESHOLD = 0.5
+FUZZY_MAX_EDIT_DISTANCE = 2
+FUZZY_QUERY_MAX_LENGTH = 100
+FUZZY_WORD_MAX_LENGTH = 30
+MEASUREMENT_UNITS = {
+    'кг': ('г', 1000),
+    'гр': ('г', 1),
+    'л': ('мл', 1000),
+    'стакан': ('мл', 250),
+    'ст. л.': ('ч. л.', 3),
+    'шт': ('шт.', 1),
+}
+BATCH_RECIPES_MAX_LENGTH = 100
+RECIPES_LIMIT_MAX = 50
+SHORT_LINK_CACHE_SIZE = 10000
+CLICK_BUFFER_MAX_SIZE = 1000
+CLICK_FLUSH_INTERVAL_SECONDS = 10
+UPLOAD_CHUNK_SIZE = 64 * 1024
@@ -0,0 +1,143 @@
+"""Распределение чтения между основной базой и репликами.
+
+Запрос безопасным методом (GET, HEAD, OPTIONS) читает из одной реплики
+из DATABASE_REPLICAS, выбранной случайно на весь запрос, поэтому все
+его запросы к базе видят одно состояние. Запись и чтение в остальных
+запросах выполняются в основной базе. После успешного изменяющего
+запроса клиент на REPLICA_PIN_SECONDS закрепляется за основной базой:
+срок сохраняется в cookie и, для запросов с токеном, в кэше. Поэтому
+Пользователь сразу видит свои изменения, даже если реплики отстают.
+Закрепление по токену работает между воркерами, только если кэш общий
+(CACHE_BACKEND). Вне запросов (команды, фоновые потоки) используется
+основная база, а общие для Пользователей кэши заполняются из неё
+внутри read_from_primary.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from hashlib import md5
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+REPLICA_PIN_COOKIE = 'primary_until'
+REPLICA_PIN_KEY = 'replica:pin:{token}'
+
+replica_alias = ContextVar('replica_alias', default=None)
+
+
+@contextmanager
+def read_from_primary():
+    """Чтение из основной базы внутри блока.
+
+    Ответы, сохраняемые в общие кэши, не должны строиться по отстающей
+    реплике: иначе устаревшие данные попадут в кэш под новой версией.
+    """
+    token = replica_alias.set(None)
+    try:
+        yield
+    finally:
+        replica_alias.reset(token)
+
+
+class ReplicaRouter:
+    """Роутер чтения из реплик для запросов безопасными методами."""
+
+    def db_for_read(self, model, **hints):
+        return replica_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaRoutingMiddleware:
+    """Включает чтение из реплик и закрепляет клиента после записи."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key = self.get_pin_key(request)
+        token = replica_alias.set(self.get_replica(
+            request, key is not None and cache.get(key)
+        ))
+        try:
+            response = self.get_response(request)
+        finally:
+            replica_alias.reset(token)
+        if self.should_pin(request, response):
+            self.pin(response)
+            if key is not None:
+                cache.set(key, True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        key = self.get_pin_key(request)
+        token = replica_alias.set(self.get_replica(
+            request, key is not None and await cache.aget(key)
+        ))
+        try:
+            response = await self.get_response(request)
+        finally:
+            replica_alias.reset(token)
+        if self.should_pin(request, response):
+            self.pin(response)
+            if key is not None:
+                await cache.aset(key, True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    @staticmethod
+    def get_pin_key(request):
+        """Ключ закрепления клиента с токеном; None без токена."""
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization or not settings.DATABASE_REPLICAS:
+            return None
+        return REPLICA_PIN_KEY.format(
+            token=md5(authorization.encode()).hexdigest()
+        )
+
+    @staticmethod
+    def get_replica(request, pinned_in_cache):
+        """Алиас реплики для чтения в запросе или None."""
+        if (not settings.DATABASE_REPLICAS
+                or request.method not in SAFE_METHODS or pinned_in_cache):
+            return None
+        try:
+            pinned_until = float(request.COOKIES.get(REPLICA_PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        if pinned_until >= time.time():
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    @staticmethod
+    def should_pin(request, response):
+        return (request.method not in SAFE_METHODS
+                and response.status_code < 400
+                and bool(settings.DATABASE_REPLICAS))
+
+    @staticmethod
+    def pin(response):
+        """Закрепляет клиента за основной базой через cookie."""
+        response.set_cookie(
+            REPLICA_PIN_COOKIE,
+            str(time.time() + settings.REPLICA_PIN_SECONDS),
+            max_age=settings.REPLICA_PIN_SECONDS,
+            httponly=True,
+            samesite='Lax'
+        )
@@ -1,12 +1,18 @@
 from django.contrib.auth import get_user_model
-from django_filters import (AllValuesMultipleFilter,
+from django.contrib.postgres.search import (SearchQuery,
+                                            SearchRank,
+                                            TrigramSimilarity)
+from django.db import connections
+from django.db.models import F, Q
+from django_filters import (CharFilter,
                             ChoiceFilter,
                             FilterSet,
-                            ModelChoiceFilter)
+                            ModelChoiceFilter,
+                            ModelMultipleChoiceFilter)
 from rest_framework import filters
 
-from .constants import RECIPE_IS_IN
-from recipes.models import Recipe
+from .constants import RECIPE_IS_IN, SEARCH_CONFIG
+from recipes.models import Recipe, Tag
 
 User = get_user_model()
 
@@ -27,8 +33,10 @@ class RecipeFilter(FilterSet):
     author = ModelChoiceFilter(
         queryset=User.objects.all()
     )
-    tags = AllValuesMultipleFilter(
+    tags = ModelMultipleChoiceFilter(
         field_name='tags__slug',
+        to_field_name='slug',
+        queryset=Tag.objects.all(),
         label='Ссылка'
     )
 
@@ -40,6 +48,10 @@ class RecipeFilter(FilterSet):
         choices=RECIPE_IS_IN,
         method='get_is_in'
     )
+    search = CharFilter(
+        method='get_search',
+        label='Поиск'
+    )
 
     def get_is_in(self, queryset, name, value):
         """Фильтрация кверисета в зависимости от параметров запроса."""
@@ -52,6 +64,27 @@ class RecipeFilter(FilterSet):
                     queryset = queryset.filter(shopping_cart__user=user)
         return queryset
 
+    def get_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию Рецепта.
+
+        В PostgreSQL ищет по поисковому вектору и триграммному сходству
+        названия и сортирует Рецепты по релевантности. В остальных СУБД
+        ищет вхождение строки.
+        """
+        if connections[queryset.db].vendor != 'postgresql':
+            return queryset.filter(
+                Q(name__icontains=value) | Q(text__icontains=value)
+            )
+        query = SearchQuery(value, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+            search_similarity=TrigramSimilarity('name', value),
+        ).filter(
+            Q(search_vector=query) | Q(name__trigram_similar=value)
+        ).order_by('-search_rank', '-search_similarity', '-id')
+
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_in_shopping_cart', 'is_favorited')
+        fields = ('author', 'tags', 'is_in_shopping_cart', 'is_favorited',
+                  'search')
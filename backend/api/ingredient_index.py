@@ -0,0 +1,243 @@
+"""Индекс справочника Ингредиентов в памяти процесса.
+
+Индекс строится при старте воркера и хранит Ингредиенты, отсортированные
+по названию в нижнем регистре, поэтому поиск по префиксу выполняется
+бинарным поиском без обращения к БД. Версия индекса сверяется с версией
+справочника в БД не чаще одного раза в INGREDIENT_INDEX_RECHECK_SECONDS
+секунд, а изменения Ингредиентов в текущем процессе сбрасывают индекс
+сразу.
+
+Для нечёткого поиска индекс хранит инвертированный список триграмм
+названий: кандидаты отбираются по общим с запросом триграммам и
+ранжируются по сходству Жаккара множеств триграмм.
+Если таких кандидатов не хватает, они дополняются Ингредиентами со
+словами на расстоянии Левенштейна не больше FUZZY_MAX_EDIT_DISTANCE от
+слов запроса, которые находятся по словарю удалений символов.
+Число вариантов удалений растёт квадратично с длиной слова, поэтому
+запрос обрезается до FUZZY_QUERY_MAX_LENGTH символов, а слова длиннее
+FUZZY_WORD_MAX_LENGTH по расстоянию не сравниваются.
+
+Перестроенный индекс публикуется одним присваиванием неизменяемого
+снимка, а каждый поиск берёт снимок один раз, поэтому поиск во время
+перестроения в другом потоке не смешивает старые и новые структуры.
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict, namedtuple
+
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db import DatabaseError
+
+from .constants import (FUZZY_MAX_EDIT_DISTANCE,
+                        FUZZY_QUERY_MAX_LENGTH,
+                        FUZZY_SIMILARITY_THRESHOLD,
+                        FUZZY_WORD_MAX_LENGTH,
+                        INGREDIENT_INDEX_RECHECK_SECONDS)
+from .db_router import read_from_primary
+from recipes.models import CatalogVersion, Ingredient
+
+logger = logging.getLogger(__name__)
+
+IndexSnapshot = namedtuple('IndexSnapshot', (
+    'version', 'updated_at', 'keys', 'items', 'postings', 'sizes',
+    'deletes', 'word_positions'
+))
+EMPTY_SNAPSHOT = IndexSnapshot(None, None, (), (), {}, (), {}, {})
+
+
+def get_trigrams(text):
+    """Множество триграмм слов строки, как в pg_trgm."""
+    trigrams = set()
+    for word in text.lower().split():
+        word = f'  {word} '
+        trigrams.update(
+            word[position:position + 3]
+            for position in range(len(word) - 2)
+        )
+    return trigrams
+
+
+def get_deletes(word, distance):
+    """Все строки, получаемые из word удалением до distance символов."""
+    deletes = frontier = {word}
+    for _ in range(distance):
+        frontier = {
+            variant[:position] + variant[position + 1:]
+            for variant in frontier
+            for position in range(len(variant))
+        }
+        deletes = deletes | frontier
+    return deletes
+
+
+def get_edit_distance(first, second):
+    """Расстояние Левенштейна между двумя строками."""
+    previous = list(range(len(second) + 1))
+    for row, first_char in enumerate(first, 1):
+        current = [row]
+        for column, second_char in enumerate(second, 1):
+            current.append(min(
+                previous[column] + 1,
+                current[column - 1] + 1,
+                previous[column - 1] + (first_char != second_char)
+            ))
+        previous = current
+    return previous[-1]
+
+
+class IngredientIndex:
+    """Отсортированный префиксный индекс Ингредиентов."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked_at = None
+        self.snapshot = EMPTY_SNAPSHOT
+
+    @staticmethod
+    def build(catalog):
+        """Снимок индекса по текущему состоянию справочника."""
+        rows = Ingredient.objects.order_by().values_list(
+            'id', 'name', 'measurement_unit'
+        )
+        items = sorted(
+            ({'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+             for pk, name, measurement_unit in rows),
+            key=lambda item: (item['name'].lower(), item['id'])
+        )
+        postings = defaultdict(list)
+        sizes = []
+        word_positions = defaultdict(list)
+        for position, item in enumerate(items):
+            trigrams = get_trigrams(item['name'])
+            sizes.append(len(trigrams))
+            for trigram in trigrams:
+                postings[trigram].append(position)
+            for word in set(item['name'].lower().split()):
+                word_positions[word].append(position)
+        deletes = defaultdict(set)
+        for word in word_positions:
+            for variant in get_deletes(word, FUZZY_MAX_EDIT_DISTANCE):
+                deletes[variant].add(word)
+        return IndexSnapshot(
+            version=catalog.version,
+            updated_at=catalog.updated_at,
+            keys=tuple(item['name'].lower() for item in items),
+            items=tuple(items),
+            postings=dict(postings),
+            sizes=tuple(sizes),
+            deletes=dict(deletes),
+            word_positions=dict(word_positions)
+        )
+
+    def refresh(self):
+        """Перестраивает индекс, если версия справочника изменилась.
+
+        Возвращает актуальный снимок. Индекс общий для всех запросов
+        процесса, поэтому строится по основной базе.
+        """
+        now = time.monotonic()
+        if (self.checked_at is not None
+                and now - self.checked_at < INGREDIENT_INDEX_RECHECK_SECONDS):
+            return self.snapshot
+        with self.lock, read_from_primary():
+            if (self.checked_at is not None
+                    and now - self.checked_at
+                    < INGREDIENT_INDEX_RECHECK_SECONDS):
+                return self.snapshot
+            catalog = CatalogVersion.get(CatalogVersion.INGREDIENTS)
+            if catalog.version != self.snapshot.version:
+                self.snapshot = self.build(catalog)
+            self.checked_at = now
+            return self.snapshot
+
+    def warm_up(self):
+        """Построение индекса при старте воркера."""
+        try:
+            self.refresh()
+        except (DatabaseError, SynchronousOnlyOperation):
+            logger.exception('Не удалось построить индекс Ингредиентов.')
+
+    def invalidate(self):
+        """Сброс проверки версии, она выполнится при следующем запросе."""
+        self.checked_at = None
+
+    def search(self, prefix, limit):
+        """Ингредиенты, название которых начинается с prefix.
+
+        Точное совпадение идёт первым, затем более короткие названия.
+        """
+        snapshot = self.refresh()
+        keys, items = snapshot.keys, snapshot.items
+        prefix = prefix.lower()
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + chr(0x10FFFF), lo=start)
+        return [items[position] for position in heapq.nsmallest(
+            limit, range(start, end),
+            key=lambda position: (len(keys[position]), keys[position])
+        )]
+
+    def fuzzy_search(self, query, limit):
+        """Ингредиенты, похожие на query с учётом опечаток и словоформ."""
+        snapshot = self.refresh()
+        query = query[:FUZZY_QUERY_MAX_LENGTH]
+        keys, items = snapshot.keys, snapshot.items
+        postings, sizes = snapshot.postings, snapshot.sizes
+        query_trigrams = get_trigrams(query)
+        if not query_trigrams:
+            return []
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(postings.get(trigram, ()))
+        threshold = FUZZY_SIMILARITY_THRESHOLD * len(query_trigrams)
+        positions = heapq.nsmallest(
+            limit,
+            (position for position, count in shared.items()
+             if count >= threshold),
+            key=lambda position: (
+                -shared[position] / (
+                    len(query_trigrams) + sizes[position] - shared[position]
+                ),
+                keys[position]
+            )
+        )
+        if len(positions) < limit:
+            found = set(positions)
+            distances = self.get_edit_distances(snapshot, query)
+            positions.extend(heapq.nsmallest(
+                limit - len(positions),
+                (position for position in distances
+                 if position not in found),
+                key=lambda position: (
+                    distances[position], len(keys[position]), keys[position]
+                )
+            ))
+        return [items[position] for position in positions]
+
+    @staticmethod
+    def get_edit_distances(snapshot, query):
+        """Суммарные расстояния от слов запроса до похожих Ингредиентов."""
+        deletes, word_positions = snapshot.deletes, snapshot.word_positions
+        distances = Counter()
+        for query_word in query.lower().split():
+            if len(query_word) > FUZZY_WORD_MAX_LENGTH:
+                continue
+            candidates = set()
+            for variant in get_deletes(query_word, FUZZY_MAX_EDIT_DISTANCE):
+                candidates.update(deletes.get(variant, ()))
+            best = {}
+            for word in candidates:
+                distance = get_edit_distance(query_word, word)
+                if distance > FUZZY_MAX_EDIT_DISTANCE:
+                    continue
+                for position in word_positions[word]:
+                    best[position] = min(
+                        distance, best.get(position, distance)
+                    )
+            distances.update(best)
+        return distances
+
+
+ingredient_index = IngredientIndex()
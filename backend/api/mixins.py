@@ -0,0 +1,125 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date, parse_http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import get_detail_key, get_list_key
+from .db_router import read_from_primary
+
+
+def conditional_response(request, etag, last_modified, get_response):
+    """Ответ 304 либо ответ get_response() с заголовками валидаторов.
+
+    last_modified передаётся как timestamp в секундах.
+    """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = get_response()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+    return set_validators(response, etag, last_modified)
+
+
+async def aconditional_response(request, etag, last_modified, get_response):
+    """Асинхронный вариант conditional_response для корутины."""
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = await get_response()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+    return set_validators(response, etag, last_modified)
+
+
+def set_validators(response, etag, last_modified):
+    """Заголовки ETag и Last-Modified ответа."""
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+class ConditionalGetMixin:
+    """Ответ 304 на условные запросы list и retrieve.
+
+    Валидаторы ETag и Last-Modified вычисляются в
+    get_conditional_validators до обращения к сериализатору.
+    """
+
+    def get_conditional_validators(self, request):
+        """Возвращает значение ETag и дату последнего изменения."""
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def conditional_response(self, get_response, request, *args, **kwargs):
+        etag, last_modified = self.get_conditional_validators(request)
+        if etag is not None:
+            etag = quote_etag(etag)
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+        return conditional_response(
+            request, etag, last_modified,
+            partial(get_response, request, *args, **kwargs)
+        )
+
+
+class AnonymousCacheMixin:
+    """Кэширование ответов list и retrieve для анонимных Пользователей.
+
+    Вместе с данными ответа кэшируются его валидаторы, поэтому условные
+    запросы к закэшированным ответам не обращаются к БД. Кэшируемый
+    ответ строится по основной базе, а не по отстающей реплике.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(
+            get_list_key(request), super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().retrieve(request, *args, **kwargs)
+        return self.cached_response(
+            get_detail_key(request, kwargs['pk']),
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, key, get_response, request, *args, **kwargs):
+        cached = cache.get(key)
+        if cached is None:
+            with read_from_primary():
+                response = get_response(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(
+                    key,
+                    (response.data,
+                     response.get('ETag'),
+                     response.get('Last-Modified')),
+                    settings.RECIPES_CACHE_TIMEOUT
+                )
+            return response
+        data, etag, last_modified = cached
+        if last_modified is not None:
+            last_modified = parse_http_date(last_modified)
+        return conditional_response(
+            request, etag, last_modified, partial(Response, data)
+        )
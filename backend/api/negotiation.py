@@ -0,0 +1,15 @@
+from rest_framework.negotiation import BaseContentNegotiation
+
+
+class IgnoreFormatParamNegotiation(BaseContentNegotiation):
+    """Выбор первого рендерера без учёта параметра format в запросе.
+
+    Нужен эндпоинтам, у которых параметр format означает формат
+    выгружаемого файла, а не формат ответа API.
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
@@ -1,10 +1,42 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
-from .constants import PAGINATION_PAGE_SIZE
+from .constants import CURSOR_PAGINATION_ORDERING, PAGINATION_PAGE_SIZE
+
+
+class CursorLimitPagination(CursorPagination):
+    """Курсорная пагинация по первичному ключу с параметром limit.
+
+    Не выполняет COUNT(*) и не использует OFFSET, поэтому время
+    получения страницы не зависит от её глубины.
+    """
+
+    page_size = PAGINATION_PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = CURSOR_PAGINATION_ORDERING
 
 
 class PageLimitPagination(PageNumberPagination):
-    """Пагинация с настройкой через параметр limit."""
+    """Пагинация с настройкой через параметр limit.
+
+    Если в запросе передан параметр cursor (в том числе пустой),
+    пагинация выполняется курсорной пагинацией CursorLimitPagination.
+    """
 
     page_size = PAGINATION_PAGE_SIZE
     page_size_query_param = 'limit'
+    cursor_pagination_class = CursorLimitPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        cursor_query_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_query_param in request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -21,3 +21,13 @@ class AuthorOrReadOnly(BasePermission):
                 or request.user.is_authenticated
                 and (request.user == obj.author
                      or request.user.is_superuser))
+
+
+class AuthorOnly(BasePermission):
+    """Доступ только автору объекта и администратору."""
+
+    def has_permission(self, request, view):
+        return request.user.is_authenticated
+
+    def has_object_permission(self, request, view, obj):
+        return request.user == obj.author or request.user.is_superuser
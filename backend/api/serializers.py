@@ -1,26 +1,40 @@
 import base64
+import os
+import secrets
 
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from .constants import (INTEGER_FIELD_MAX_VALUE,
+from .constants import (BATCH_RECIPES_MAX_LENGTH,
+                        INTEGER_FIELD_MAX_VALUE,
                         INTEGER_FIELD_MIN_VALUE,
-                        CHAR_FIELD_MAX_LENGTH)
+                        CHAR_FIELD_MAX_LENGTH,
+                        RECIPES_LIMIT_MAX)
+from .uploads import UploadedImage, discard_on_commit
+from recipes.constants import (UPLOAD_MAX_OPEN_PER_USER,
+                               UPLOAD_MAX_SIZE,
+                               UPLOAD_TOKEN_LENGTH)
 from recipes.models import (Ingredient,
                             Favorite,
+                            ImageUpload,
                             Recipe,
                             RecipeIngredient,
                             Tag,
-                            ShoppingCart)
+                            ShoppingCart,
+                            ShoppingCartIngredient)
+from recipes.renditions import schedule_renditions
+from users.models import Subscribe
 
 User = get_user_model()
 
 
 class Base64ImageField(serializers.ImageField):
-    """Кастомное поле для изображений в base64."""
+    """Кастомное поле для изображений в base64 или токена загрузки."""
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
@@ -28,9 +42,85 @@ class Base64ImageField(serializers.ImageField):
             ext = format.split('/')[-1]
 
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+        elif isinstance(data, str):
+            data = self.get_uploaded_image(data)
 
         return super().to_internal_value(data)
 
+    def get_uploaded_image(self, token):
+        """Завершённая загрузка текущего Пользователя по токену."""
+        upload = ImageUpload.objects.filter(
+            token=token,
+            user=self.context['request'].user.pk
+        ).first()
+        if (
+            upload is None
+            or not upload.completed
+            or not os.path.exists(upload.path)
+        ):
+            raise ValidationError('Загрузка не найдена или не завершена.')
+        return UploadedImage(upload)
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """Сериализатор загрузки изображения по частям."""
+    size = serializers.IntegerField(
+        min_value=INTEGER_FIELD_MIN_VALUE,
+        max_value=UPLOAD_MAX_SIZE
+    )
+
+    class Meta:
+        model = ImageUpload
+        fields = ('token', 'size', 'offset', 'completed')
+        read_only_fields = ('token', 'offset', 'completed')
+
+    def validate(self, data):
+        """Число незавершённых и неиспользованных загрузок ограничено."""
+        ImageUpload.clear_expired()
+        if self.context['request'].user.image_uploads.count() >= (
+            UPLOAD_MAX_OPEN_PER_USER
+        ):
+            raise ValidationError(
+                f'Одновременно можно держать не больше '
+                f'{UPLOAD_MAX_OPEN_PER_USER} загрузок.'
+            )
+        return data
+
+    def create(self, validated_data):
+        return ImageUpload.objects.create(
+            token=secrets.token_urlsafe(UPLOAD_TOKEN_LENGTH * 3 // 4),
+            user=self.context['request'].user,
+            **validated_data
+        )
+
+
+def get_subscribed_ids(request):
+    """Id авторов, на которых подписан текущий Пользователь.
+
+    Загружаются одним запросом и запоминаются в запросе, поэтому все
+    сериализаторы Пользователей на странице используют одно множество.
+    """
+    if request is None or request.user.is_anonymous:
+        return frozenset()
+    subscribed_ids = getattr(request, '_subscribed_ids', None)
+    if subscribed_ids is None:
+        subscribed_ids = frozenset(
+            Subscribe.objects.filter(
+                user=request.user
+            ).values_list('subscribing_id', flat=True)
+        )
+        request._subscribed_ids = subscribed_ids
+    return subscribed_ids
+
+
+class IsSubscribedMixin(serializers.Serializer):
+    """Поле is_subscribed, вычисляемое по подпискам из запроса."""
+    is_subscribed = serializers.SerializerMethodField(read_only=True)
+
+    def get_is_subscribed(self, author):
+        """Возвращает True, если текущий Пользователь подписан на Автора."""
+        return author.id in get_subscribed_ids(self.context.get('request'))
+
 
 class UserCreationSerializer(UserCreateSerializer):
     """Кастомизация сериализатора регистрации пользователя."""
@@ -38,9 +128,8 @@ class UserCreationSerializer(UserCreateSerializer):
     last_name = serializers.CharField(max_length=CHAR_FIELD_MAX_LENGTH)
 
 
-class FoodgramUserSerializer(UserSerializer):
+class FoodgramUserSerializer(IsSubscribedMixin, UserSerializer):
     """Кастомизация сериализатора модели Пользователя."""
-    is_subscribed = serializers.BooleanField(read_only=True)
     avatar = serializers.SerializerMethodField(read_only=True)
 
     class Meta(UserSerializer.Meta):
@@ -65,8 +154,12 @@ class UserAvatarSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         if 'avatar' in validated_data:
+            old_avatar = instance.avatar.name
             instance.avatar = validated_data['avatar']
             instance.save()
+            discard_on_commit(validated_data['avatar'])
+            if old_avatar:
+                instance.avatar.storage.delete(old_avatar)
         return instance
 
     def delete_avatar(self, instance):
@@ -78,6 +171,7 @@ class UserAvatarSerializer(serializers.ModelSerializer):
 
 class SubscribeUserSerializer(FoodgramUserSerializer):
     """Сериализатор запросов на подписку на автора."""
+    is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
 
@@ -103,14 +197,39 @@ class SubscribeUserSerializer(FoodgramUserSerializer):
 
         return data
 
-    def get_recipes(self, author):
-        """Получение списка рецептов Пользователя."""
-        request = self.context['request']
-        recipes_limit = request.query_params.get('recipes_limit')
+    def get_is_subscribed(self, author):
+        """Сериализатор описывает автора, на которого подписан Пользователь."""
+        return True
 
-        if recipes_limit:
+    @staticmethod
+    def parse_recipes_limit(request):
+        """Значение recipes_limit, ограниченное RECIPES_LIMIT_MAX."""
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit is None:
+            return RECIPES_LIMIT_MAX
+        try:
             recipes_limit = int(recipes_limit)
-        recipes = author.recipes.all()[:recipes_limit]
+        except ValueError:
+            recipes_limit = -1
+        if recipes_limit < 0:
+            raise ValidationError(
+                {'recipes_limit': 'Ожидается неотрицательное целое число.'}
+            )
+        return min(recipes_limit, RECIPES_LIMIT_MAX)
+
+    def get_recipes(self, author):
+        """Получение списка рецептов Пользователя.
+
+        Если Рецепты предзагружены в limited_recipes, запросов к базе
+        не выполняется.
+        """
+        request = self.context['request']
+        if hasattr(author, 'limited_recipes'):
+            recipes = author.limited_recipes
+        else:
+            recipes = author.recipes.all()[
+                :self.parse_recipes_limit(request)
+            ]
 
         return AddRecipeSerializer(
             recipes,
@@ -119,11 +238,11 @@ class SubscribeUserSerializer(FoodgramUserSerializer):
         ).data
 
     def get_recipes_count(self, author):
-        """Подсчет количества рецептов Автора."""
-        return author.recipes.all().count()
+        """Количество рецептов Автора из счётчика."""
+        return author.recipes_count
 
 
-class AuthorSerializer(serializers.ModelSerializer):
+class AuthorSerializer(IsSubscribedMixin, serializers.ModelSerializer):
     """Сериализатор запросов к Автору контента."""
 
     class Meta:
@@ -169,13 +288,33 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'amount', 'measurement_unit')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class ImageRenditionsMixin:
+    """Ссылки на варианты изображения Рецепта в поле image_renditions.
+
+    Поле выводится только по запросу с параметром renditions=1, чтобы
+    не менять формат ответов для существующих клиентов.
+    """
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        request = self.context.get('request')
+        if request and request.query_params.get('renditions') == '1':
+            representation['image_renditions'] = {
+                rendition: request.build_absolute_uri(
+                    instance.image.storage.url(name)
+                )
+                for rendition, name in instance.image_renditions.items()
+            }
+        return representation
+
+
+class RecipeSerializer(ImageRenditionsMixin, serializers.ModelSerializer):
     """Сериализатор рецептов."""
     ingredients = RecipeIngredientSerializer(many=True,
                                              source='recipe_ingredient')
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        write_only=True
     )
     cooking_time = serializers.IntegerField(
         min_value=INTEGER_FIELD_MIN_VALUE,
@@ -207,20 +346,18 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         ingredient_ids = [ingredient['ingredient']['id']
                           for ingredient in ingredients]
-        tag_ids = [tag.id for tag in tags]
 
-        if (not Ingredient.objects.filter(id__in=ingredient_ids).count()
-                == len(ingredient_ids)):
+        if (Ingredient.objects.filter(id__in=ingredient_ids).count()
+                != len(set(ingredient_ids))):
             raise ValidationError('Указаны несуществующие ингредиенты.')
 
-        if (not Tag.objects.filter(id__in=tag_ids).count()
-                == len(tag_ids)):
+        if Tag.objects.filter(id__in=tags).count() != len(set(tags)):
             raise ValidationError('Указаны несуществующие тэги.')
 
         if len(ingredient_ids) != len(set(ingredient_ids)):
             raise ValidationError('Такой ингредиент уже есть в рецепте.')
 
-        if len(tag_ids) != len(set(tag_ids)):
+        if len(tags) != len(set(tags)):
             raise ValidationError('Такой тэг уже присвоен рецепту.')
 
         return data
@@ -235,58 +372,76 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, recipe):
         """Возвращает True, если рецепт добавлен в Список покупок."""
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         return self.is_recipe_in(ShoppingCart, recipe)
 
     def get_is_favorited(self, recipe):
         """Возвращает True, если рецепт добавлен в Избранное."""
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         return self.is_recipe_in(Favorite, recipe)
 
-    def create_ingredients(self, ingredients, recipe):
-        """Создание списка Ингредиентов в рецепте."""
-        recipe_ingredients = []
-
-        for ingredient_data in ingredients:
-            ingredient_id = ingredient_data['ingredient']['id']
-            ingredient = Ingredient.objects.get(id=ingredient_id)
-            amount = ingredient_data['amount']
-            recipe_ingredients.append(RecipeIngredient(
-                recipe=recipe,
-                ingredient=ingredient,
-                amount=amount
-            ))
-
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+    @staticmethod
+    def get_amounts(ingredients):
+        """Количества из запроса по id Ингредиента."""
+        return {
+            ingredient['ingredient']['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
 
+    @transaction.atomic
     def create(self, validated_data):
         """Переопределение метода для обработки Тэгов и Ингредиентов."""
         ingredients = validated_data.pop('recipe_ingredient')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
+        discard_on_commit(validated_data['image'])
 
-        self.create_ingredients(ingredients, recipe)
-
-        recipe.tags.set(tags)
+        recipe.set_ingredients(self.get_amounts(ingredients), created=True)
+        recipe.set_tags(tags, created=True)
+        schedule_renditions(recipe.id)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Редактирование рецепта."""
+        """Редактирование рецепта.
+
+        Строки Ингредиентов и Тэгов сравниваются с запросом, и изменяются
+        только отличающиеся. Разница в составе Ингредиентов переносится
+        в корзины Пользователей, добавивших Рецепт в Список покупок.
+        """
         recipe = instance
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('recipe_ingredient')
-        RecipeIngredient.objects.filter(recipe=recipe).delete()
-
-        self.create_ingredients(
-            ingredients,
-            recipe
+        Recipe.lock((recipe.id,))
+        ShoppingCartIngredient.apply_recipe(
+            recipe.id, recipe.set_ingredients(self.get_amounts(ingredients))
         )
-
-        updated_instance = super().update(instance, validated_data)
-        updated_instance.tags.set(tags)
-
-        return updated_instance
+        recipe.set_tags(tags)
+
+        if 'image' in validated_data:
+            instance.delete_files_on_commit(instance.get_file_names())
+            instance.image_renditions = {}
+            schedule_renditions(instance.id)
+        super().update(instance, validated_data)
+        discard_on_commit(validated_data.get('image'))
+        return instance
 
     def to_representation(self, instance):
-        """Переопределение вывода Тэгов при создании рецепта."""
+        """Переопределение вывода Тэгов при создании рецепта.
+
+        Тэги и Ингредиенты записанного Рецепта загружаются двумя
+        запросами, на странице списка используются уже загруженные.
+        """
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            Prefetch(
+                'recipe_ingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
         representation = super().to_representation(instance)
         tags_data = [{'id': tag.id, 'name': tag.name, 'slug': tag.slug}
                      for tag in instance.tags.all()]
@@ -294,7 +449,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         return representation
 
 
-class AddRecipeSerializer(serializers.ModelSerializer):
+class AddRecipeSerializer(ImageRenditionsMixin,
+                          serializers.ModelSerializer):
     """Сериализатор запросов к модели Списка покупок и избранного."""
     image = serializers.SerializerMethodField()
     name = serializers.ReadOnlyField()
@@ -310,3 +466,22 @@ class AddRecipeSerializer(serializers.ModelSerializer):
         if obj.image:
             return request.build_absolute_uri(obj.image.url)
         return None
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id Рецептов пакетного запроса."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BATCH_RECIPES_MAX_LENGTH
+    )
+
+    def validate_recipes(self, value):
+        """Повторяющиеся id учитываются один раз."""
+        return list(dict.fromkeys(value))
+
+
+class TransferParamsSerializer(serializers.Serializer):
+    """Параметры продолжения выгрузки и загрузки Рецептов."""
+    after = serializers.IntegerField(min_value=0, default=0)
+    skip = serializers.IntegerField(min_value=0, default=0)
@@ -0,0 +1,94 @@
+"""Потоковая выгрузка Списка покупок в разных форматах.
+
+Каждый формат — генератор, который получает строки Списка покупок
+(словари с ключами name, measurement_unit и amount) и отдаёт текст
+по частям для StreamingHttpResponse.
+"""
+import csv
+import json
+
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .constants import MEASUREMENT_UNITS
+from recipes.models import ShoppingCartIngredient
+
+SHOPPING_LIST_FILENAME = 'Список_покупок'
+
+
+def get_unit_conversion():
+    """Выражения канонической единицы измерения и множителя к ней."""
+    unit = F('ingredient__measurement_unit')
+    canonical_unit = Case(
+        *(When(ingredient__measurement_unit=name, then=Value(canonical))
+          for name, (canonical, _) in MEASUREMENT_UNITS.items()),
+        default=unit
+    )
+    factor = Case(
+        *(When(ingredient__measurement_unit=name, then=Value(factor))
+          for name, (_, factor) in MEASUREMENT_UNITS.items()),
+        default=Value(1),
+        output_field=IntegerField()
+    )
+    return canonical_unit, factor
+
+
+def get_shopping_list(user):
+    """Строки Списка покупок пользователя.
+
+    Читаются материализованные суммы ShoppingCartIngredient; количества
+    приводятся к каноническим единицам из MEASUREMENT_UNITS, так что
+    «кг» и «г» одного ингредиента попадают в одну строку.
+    """
+    canonical_unit, factor = get_unit_conversion()
+    return ShoppingCartIngredient.objects.filter(
+        user=user
+    ).values(
+        name=F('ingredient__name'),
+        measurement_unit=canonical_unit,
+    ).annotate(
+        amount=Sum(F('total_amount') * factor)
+    ).order_by('name', 'measurement_unit')
+
+
+class Echo:
+    """Псевдобуфер, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_txt(rows):
+    """Список покупок в виде текста."""
+    for row in rows:
+        yield f'{row["name"]}: {row["amount"]} {row["measurement_unit"]}\n'
+
+
+def render_csv(rows):
+    """Список покупок в формате CSV."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for row in rows:
+        yield writer.writerow(
+            (row['name'], row['amount'], row['measurement_unit'])
+        )
+
+
+def render_json(rows):
+    """Список покупок в виде JSON-массива."""
+    separator = '['
+    for row in rows:
+        yield separator + json.dumps(
+            {'name': row['name'],
+             'amount': row['amount'],
+             'measurement_unit': row['measurement_unit']},
+            ensure_ascii=False
+        )
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', render_txt),
+    'csv': ('text/csv; charset=utf-8', render_csv),
+    'json': ('application/json', render_json),
+}
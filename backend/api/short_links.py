@@ -0,0 +1,203 @@
+"""Кэш соответствий кодов коротких ссылок и Рецептов.
+
+Соответствия код → id Рецепта и id Рецепта → код хранятся в памяти
+процесса в LRU-кэшах ограниченного размера, поэтому повторные переходы
+по популярным ссылкам обслуживаются без запросов к базе. Коды
+не меняются, а при удалении Рецепта его записи удаляются из кэшей.
+Промахи кэша читаются из основной базы, чтобы отстающая реплика
+не вернула в кэш ссылку удалённого Рецепта. Удаление Рецепта
+увеличивает версию в общем кэше Django, и остальные процессы
+очищают свои LRU-кэши при следующем обращении.
+
+Переходы по ссылкам копятся в буфере процесса и записываются в базу
+пачками одним UPDATE с относительным приращением: при переполнении,
+фоновым потоком раз в CLICK_FLUSH_INTERVAL_SECONDS, перед чтением
+статистики и при завершении процесса.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.db import DatabaseError, close_old_connections
+from django.db.models import BigIntegerField, Case, F, When
+
+from .cache import bump_version, get_version
+from .constants import (CLICK_BUFFER_MAX_SIZE,
+                        CLICK_FLUSH_INTERVAL_SECONDS,
+                        SHORT_LINK_CACHE_SIZE)
+from .db_router import read_from_primary
+from recipes.models import ShortLinkRecipe
+
+logger = logging.getLogger(__name__)
+
+SHORT_LINKS_VERSION_KEY = 'short_links:version'
+
+
+class LRUCache:
+    """Потокобезопасный словарь ограниченного размера.
+
+    При переполнении вытесняется элемент, к которому дольше всего
+    не обращались.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Значение по ключу или None."""
+        with self.lock:
+            if key not in self.data:
+                return None
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def set(self, key, value):
+        """Сохраняет значение, вытесняя самые старые элементы."""
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def discard(self, predicate):
+        """Удаляет элементы, для которых predicate(key, value) истинно."""
+        with self.lock:
+            for key in [key for key, value in self.data.items()
+                        if predicate(key, value)]:
+                del self.data[key]
+
+
+class ShortLinkCache:
+    """Кэш коротких ссылок с запасным чтением из ShortLinkRecipe."""
+
+    def __init__(self, max_size):
+        self.recipe_ids = LRUCache(max_size)
+        self.codes = LRUCache(max_size)
+        self.version = None
+
+    def check_version(self):
+        """Очищает кэши, если Рецепты удалялись в другом процессе."""
+        version = get_version(SHORT_LINKS_VERSION_KEY)
+        if version != self.version:
+            self.recipe_ids.clear()
+            self.codes.clear()
+            self.version = version
+
+    def remember(self, code, recipe_id):
+        """Сохраняет соответствие в оба кэша."""
+        self.recipe_ids.set(code, recipe_id)
+        self.codes.set(recipe_id, code)
+
+    def get_recipe_id(self, code):
+        """Id Рецепта по коду ссылки или None."""
+        self.check_version()
+        recipe_id = self.recipe_ids.get(code)
+        if recipe_id is None:
+            with read_from_primary():
+                recipe_id = ShortLinkRecipe.objects.filter(
+                    short_link_code=code
+                ).values_list('recipe_id', flat=True).first()
+            if recipe_id is not None:
+                self.remember(code, recipe_id)
+        return recipe_id
+
+    def get_code(self, recipe_id):
+        """Код ссылки Рецепта или None."""
+        self.check_version()
+        code = self.codes.get(recipe_id)
+        if code is None:
+            with read_from_primary():
+                code = ShortLinkRecipe.objects.filter(
+                    recipe_id=recipe_id
+                ).values_list('short_link_code', flat=True).first()
+            if code is not None:
+                self.remember(code, recipe_id)
+        return code
+
+    def invalidate_recipe(self, recipe_id):
+        """Удаляет из кэшей ссылки удалённого Рецепта."""
+        bump_version(SHORT_LINKS_VERSION_KEY)
+        self.codes.discard(lambda key, value: key == recipe_id)
+        self.recipe_ids.discard(lambda key, value: value == recipe_id)
+
+
+class ClickBuffer:
+    """Буфер переходов по коротким ссылкам.
+
+    Переходы суммируются по кодам и сбрасываются в базу, когда их
+    накапливается max_size или с прошлого сброса прошло
+    flush_interval секунд. Счётчики увеличиваются выражением
+    clicks = clicks + n, поэтому сбросы разных процессов не теряют
+    переходы друг друга.
+    """
+
+    def __init__(self, max_size, flush_interval):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.pending = Counter()
+        self.flushed_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add(self, code):
+        """Учитывает переход по ссылке."""
+        with self.lock:
+            self.pending[code] += 1
+            if (sum(self.pending.values()) < self.max_size
+                    and time.monotonic() - self.flushed_at
+                    < self.flush_interval):
+                return
+        self.flush()
+
+    def get_pending(self, code):
+        """Число ещё не записанных переходов по ссылке."""
+        with self.lock:
+            return self.pending[code]
+
+    def flush(self):
+        """Записывает накопленные переходы одним запросом."""
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.flushed_at = time.monotonic()
+        if not pending:
+            return
+        try:
+            ShortLinkRecipe.objects.filter(
+                short_link_code__in=pending
+            ).update(clicks=F('clicks') + Case(
+                *(When(short_link_code=code, then=count)
+                  for code, count in pending.items()),
+                default=0,
+                output_field=BigIntegerField()
+            ))
+        except DatabaseError:
+            with self.lock:
+                self.pending.update(pending)
+
+    def start_flushing(self):
+        """Запускает фоновый сброс буфера раз в flush_interval секунд."""
+        threading.Thread(
+            target=self.flush_periodically, name='click-buffer', daemon=True
+        ).start()
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Не удалось записать переходы по ссылкам.')
+            finally:
+                close_old_connections()
+
+
+short_links = ShortLinkCache(SHORT_LINK_CACHE_SIZE)
+clicks = ClickBuffer(CLICK_BUFFER_MAX_SIZE, CLICK_FLUSH_INTERVAL_SECONDS)
+atexit.register(clicks.flush)
@@ -0,0 +1,96 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_catalog, invalidate_recipe
+from .ingredient_index import ingredient_index
+from .short_links import short_links
+from recipes.management.commands.load_catalog import catalog_loaded
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.renditions import renditions_created
+from recipes.transfer import recipes_imported
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_cache(sender, instance, **kwargs):
+    """Инвалидация кэша при изменении Рецепта."""
+    transaction.on_commit(partial(invalidate_recipe, instance.pk))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_recipe_ingredient_cache(sender, instance, **kwargs):
+    """Инвалидация кэша при изменении ингредиентов Рецепта."""
+    transaction.on_commit(partial(invalidate_recipe, instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags_cache(sender, instance, action, reverse,
+                                 pk_set, **kwargs):
+    """Инвалидация кэша при изменении Тэгов Рецепта."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        transaction.on_commit(partial(invalidate_recipe, instance.pk))
+    elif pk_set is None:
+        transaction.on_commit(invalidate_catalog)
+    else:
+        for pk in pk_set:
+            transaction.on_commit(partial(invalidate_recipe, pk))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Инвалидация кэша при изменении справочников."""
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_cache(sender, created, update_fields, **kwargs):
+    """Инвалидация кэша при изменении данных автора."""
+    if created or update_fields and set(update_fields) == {'last_login'}:
+        return
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    """Сброс индекса Ингредиентов при изменении справочника."""
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_short_links(sender, instance, **kwargs):
+    """Удаление коротких ссылок удалённого Рецепта из кэша."""
+    transaction.on_commit(partial(short_links.invalidate_recipe, instance.pk))
+
+
+@receiver(recipes_imported)
+def invalidate_imported_recipes(sender, **kwargs):
+    """Инвалидация кэша и индекса после массовой загрузки Рецептов."""
+    transaction.on_commit(invalidate_catalog)
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver(catalog_loaded)
+def invalidate_loaded_catalog(sender, **kwargs):
+    """Инвалидация кэша и индекса после загрузки справочника."""
+    transaction.on_commit(invalidate_catalog)
+    if sender is Ingredient:
+        transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver(renditions_created)
+def invalidate_recipe_renditions(sender, recipe_id, **kwargs):
+    """Инвалидация кэша после создания вариантов изображения."""
+    transaction.on_commit(partial(invalidate_recipe, recipe_id))
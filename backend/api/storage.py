@@ -0,0 +1,77 @@
+"""Хранилище медиафайлов с адресацией по содержимому.
+
+Файл сохраняется под именем из SHA-256 его содержимого в каталоге,
+запрошенном при загрузке: recipes/images/ab/ab12…ef.png. Повторная
+загрузка того же изображения не создаёт копию, а увеличивает счётчик
+ссылок StoredFile; удаление уменьшает счётчик и стирает файл, когда
+ссылок не остаётся. Имена файлов не переиспользуются для другого
+содержимого, поэтому их можно кэшировать как неизменяемые.
+
+Файл записывается и стирается под блокировкой строки StoredFile
+(UPDATE счётчика или SELECT FOR UPDATE до конца транзакции), поэтому
+одновременные сохранение и удаление одного содержимого не оставляют
+ссылку на стёртый файл.
+"""
+import hashlib
+import posixpath
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище с дедупликацией и счётчиком ссылок."""
+
+    @staticmethod
+    def get_stored_files():
+        return apps.get_model('recipes', 'StoredFile').objects
+
+    def get_content_name(self, name, content):
+        """Имя файла по хэшу содержимого с сохранением каталога."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        hexdigest = digest.hexdigest()
+        return posixpath.join(
+            directory, hexdigest[:2], f'{hexdigest}{extension}'
+        )
+
+    def _save(self, name, content):
+        name = self.get_content_name(name, content)
+        stored_files = self.get_stored_files()
+        with transaction.atomic():
+            stored_files.bulk_create(
+                [stored_files.model(name=name)], ignore_conflicts=True
+            )
+            stored_files.filter(name=name).update(
+                references=F('references') + 1
+            )
+            if self.exists(name):
+                return name
+            return super()._save(name, content)
+
+    def delete(self, name):
+        """Уменьшает число ссылок и удаляет файл без ссылок.
+
+        Файлы, сохранённые до подсчёта ссылок, удаляются сразу.
+        """
+        if not name:
+            return super().delete(name)
+        with transaction.atomic():
+            stored_file = self.get_stored_files().select_for_update().filter(
+                name=name
+            ).first()
+            if stored_file is not None and stored_file.references > 1:
+                stored_file.references = F('references') - 1
+                stored_file.save(update_fields=('references',))
+                return
+            if stored_file is not None:
+                stored_file.delete()
+            super().delete(name)
@@ -0,0 +1,118 @@
+"""Загрузка изображений по частям.
+
+Клиент создаёт загрузку с итоговым размером, а затем отправляет части
+запросами PATCH с заголовком Upload-Offset. Часть пишется потоком
+в отдельный файл без буферизации всего тела в памяти и без блокировки
+загрузки, а затем под короткой блокировкой дописывается во временный
+файл загрузки. Повтор части после обрыва соединения начинается
+с последнего подтверждённого смещения. Готовая загрузка передаётся
+в поле изображения по токену, файл переносится в хранилище без
+повторного чтения в память, а загрузка удаляется после сохранения.
+"""
+import os
+import secrets
+import shutil
+
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from .constants import UPLOAD_CHUNK_SIZE
+from recipes.constants import IMAGE_HEADER_LENGTH
+
+
+class UploadedImage(UploadedFile):
+    """Готовая загрузка, открытая из временного файла.
+
+    Наличие temporary_file_path позволяет проверке изображения
+    и файловому хранилищу работать с файлом на диске.
+    """
+
+    def __init__(self, upload):
+        self.upload = upload
+        self.upload_path = upload.path
+        super().__init__(
+            file=open(upload.path, 'rb'),
+            name=f'upload.{upload.extension}',
+            content_type=f'image/{upload.extension}',
+            size=upload.size
+        )
+
+    def temporary_file_path(self):
+        return self.upload_path
+
+    def discard(self):
+        """Закрывает файл и удаляет использованную загрузку."""
+        self.close()
+        self.upload.discard()
+
+
+def discard_on_commit(file):
+    """Удаляет загрузку, переданную в поле по токену, после фиксации.
+
+    Хранилище не переносит временный файл, если такое содержимое уже
+    сохранено, поэтому файл и строка загрузки удаляются явно.
+    """
+    if isinstance(file, UploadedImage):
+        transaction.on_commit(file.discard)
+
+
+def write_chunk(upload, stream):
+    """Пишет часть из потока запроса в отдельный файл.
+
+    Возвращает путь к файлу части и число записанных байт. Часть
+    длиннее остатка загрузки отклоняется, а при ошибке файл части
+    удаляется.
+    """
+    remaining = upload.size - upload.offset
+    written = 0
+    os.makedirs(os.path.dirname(upload.path), exist_ok=True)
+    path = f'{upload.path}.{secrets.token_hex(8)}'
+    try:
+        with open(path, 'wb') as file:
+            while stream is not None:
+                chunk = stream.read(
+                    min(UPLOAD_CHUNK_SIZE, remaining - written + 1)
+                )
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > remaining:
+                    raise ValidationError(
+                        {'size': 'Часть выходит за пределы загрузки.'}
+                    )
+                file.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, written
+
+
+def append_chunk(upload, path):
+    """Дописывает файл части во временный файл с upload.offset.
+
+    Файл обрезается до подтверждённого смещения, поэтому остатки
+    оборванной части перезаписываются.
+    """
+    with open(upload.path, 'ab') as file, open(path, 'rb') as chunk:
+        file.truncate(upload.offset)
+        shutil.copyfileobj(chunk, file, UPLOAD_CHUNK_SIZE)
+
+
+def validate_upload(upload):
+    """Проверяет сигнатуру и, после завершения, целостность изображения."""
+    if not upload.extension and (
+        upload.offset >= IMAGE_HEADER_LENGTH or upload.completed
+    ):
+        with open(upload.path, 'rb') as file:
+            header = file.read(IMAGE_HEADER_LENGTH)
+        upload.extension = upload.get_extension(header) or ''
+        if not upload.extension:
+            raise ValidationError({'file': 'Файл не является изображением.'})
+    if upload.completed:
+        try:
+            with Image.open(upload.path) as image:
+                image.verify()
+        except Exception:
+            raise ValidationError({'file': 'Изображение повреждено.'})
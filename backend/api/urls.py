@@ -1,7 +1,9 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import SimpleRouter
 
 from . import views
+from .async_views import get_async_urls
 
 
 app_name = 'api'
@@ -13,6 +15,7 @@ router.register(r'ingredients',
                 views.IngridientsViewSet,
                 basename='ingredients')
 router.register(r'tags', views.TagsViewSet, basename='tags')
+router.register(r'uploads', views.ImageUploadViewSet, basename='uploads')
 
 urlpatterns = [
     path(
@@ -26,7 +29,10 @@ urlpatterns = [
             'get': 'list'
         })
     ),
-    path('', include(router.urls)),
+    path('', include(
+        get_async_urls(router.urls) if settings.ASYNC_READ_VIEWS
+        else router.urls
+    )),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
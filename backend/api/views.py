@@ -1,32 +1,61 @@
+import os
+from functools import partial
+from hashlib import md5
+
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse, JsonResponse
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import Count, Exists, Max, OuterRef, Prefetch, Value
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
+from django.utils.cache import quote_etag
+from django.utils.http import content_disposition_header
 from django.views import View
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import filters, mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from .constants import INGREDIENT_SEARCH_LIMIT
 from .filters import FirstLetterFilter, RecipeFilter
+from .ingredient_index import ingredient_index
+from .mixins import (AnonymousCacheMixin,
+                     ConditionalGetMixin,
+                     conditional_response)
+from .negotiation import IgnoreFormatParamNegotiation
 from .paginations import PageLimitPagination
-from .permissions import AllowAnyExceptEndpointMe, AuthorOrReadOnly
+from .permissions import (AllowAnyExceptEndpointMe,
+                          AuthorOnly,
+                          AuthorOrReadOnly)
 from .serializers import (AddRecipeSerializer,
+                          ImageUploadSerializer,
                           IngredientSerializer,
+                          RecipeIdsSerializer,
                           RecipeSerializer,
                           SubscribeUserSerializer,
                           TagSerializer,
+                          TransferParamsSerializer,
                           UserAvatarSerializer,)
+from .shopping_list import (SHOPPING_LIST_FILENAME,
+                            SHOPPING_LIST_FORMATS,
+                            get_shopping_list)
+from .short_links import clicks, short_links
+from .uploads import append_chunk, validate_upload, write_chunk
 from users.models import Subscribe
-from recipes.models import (Favorite,
+from recipes.models import (CatalogVersion,
+                            Favorite,
+                            FeedEntry,
                             Ingredient,
                             Recipe,
                             RecipeIngredient,
                             Tag,
                             ShoppingCart,
-                            ShortLinkRecipe,)
+                            ShoppingCartIngredient,
+                            ShortLinkRecipe,
+                            update_counter)
+from recipes.transfer import RecipeImporter, export_recipes
 
 User = get_user_model()
 
@@ -54,7 +83,9 @@ class FoodgramUserViewSet(UserViewSet):
                          'author': author}
             )
             serializer.is_valid(raise_exception=True)
-            Subscribe.objects.create(user=user, subscribing=author)
+            with transaction.atomic():
+                Subscribe.objects.create(user=user, subscribing=author)
+                update_counter(User, (author.id,), 'followers_count', 1)
             return Response(data=serializer.data,
                             status=status.HTTP_201_CREATED)
 
@@ -64,7 +95,9 @@ class FoodgramUserViewSet(UserViewSet):
             except Subscribe.DoesNotExist:
                 return Response({'Ошибка': 'Подписка не найдена.'},
                                 status=status.HTTP_400_BAD_REQUEST)
-            subscription.delete()
+            with transaction.atomic():
+                subscription.delete()
+                update_counter(User, (author.id,), 'followers_count', -1)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -85,14 +118,104 @@ class UserAvatarViewSet(mixins.UpdateModelMixin,
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class ImageUploadViewSet(mixins.CreateModelMixin,
+                         mixins.RetrieveModelMixin,
+                         viewsets.GenericViewSet):
+    """Загрузка изображения по частям с продолжением после обрыва."""
+    serializer_class = ImageUploadSerializer
+    permission_classes = (IsAuthenticated,)
+    lookup_field = 'token'
+
+    def get_queryset(self):
+        return self.request.user.image_uploads.all()
+
+    def get_offset_response(self, upload, status_code=status.HTTP_200_OK):
+        return Response(
+            self.get_serializer(upload).data,
+            status=status_code,
+            headers={'Upload-Offset': str(upload.offset)}
+        )
+
+    def retrieve(self, request, token=None):
+        return self.get_offset_response(self.get_object())
+
+    def partial_update(self, request, token=None):
+        """Дописывает часть тела запроса со смещения Upload-Offset.
+
+        Тело читается в отдельный файл без блокировки, поэтому медленный
+        клиент не держит транзакцию. Под блокировкой смещение проверяется
+        повторно, и из двух одновременных частей принимается одна.
+        При несовпадении смещения возвращается 409 с текущим смещением,
+        с которого клиент продолжает загрузку.
+        """
+        upload = get_object_or_404(self.get_queryset(), token=token)
+        offset = request.headers.get('Upload-Offset')
+        if offset != str(upload.offset):
+            return self.get_offset_response(
+                upload, status_code=status.HTTP_409_CONFLICT
+            )
+        try:
+            path, written = write_chunk(upload, request.stream)
+        except ValidationError as error:
+            return self.discard_upload(upload.pk, error)
+        try:
+            with transaction.atomic():
+                upload = get_object_or_404(
+                    self.get_queryset().select_for_update(), token=token
+                )
+                if offset != str(upload.offset):
+                    return self.get_offset_response(
+                        upload, status_code=status.HTTP_409_CONFLICT
+                    )
+                append_chunk(upload, path)
+                upload.offset += written
+                try:
+                    validate_upload(upload)
+                except ValidationError as error:
+                    return self.discard_upload(upload.pk, error)
+                upload.save(update_fields=('offset', 'extension'))
+        finally:
+            os.remove(path)
+        return self.get_offset_response(upload)
+
+    def discard_upload(self, pk, error):
+        """Удаляет отклонённую загрузку и возвращает ответ 400."""
+        with transaction.atomic():
+            upload = self.get_queryset().select_for_update().filter(
+                pk=pk
+            ).first()
+            if upload is not None:
+                upload.discard()
+        return Response(error.detail, status=status.HTTP_400_BAD_REQUEST)
+
+
 class GetSubscribersViewSet(mixins.ListModelMixin,
                             viewsets.GenericViewSet):
     """Вью для получения списка пользователей."""
     serializer_class = SubscribeUserSerializer
     permission_classes = (IsAuthenticated,)
+    pagination_class = PageLimitPagination
 
     def get_queryset(self):
-        return User.objects.filter(subscribtions__user=self.request.user)
+        """Авторы с первыми recipes_limit Рецептами.
+
+        Рецепты всех авторов страницы загружаются одним запросом
+        с оконной функцией, поэтому число запросов не зависит от размера
+        страницы.
+        """
+        recipes_limit = SubscribeUserSerializer.parse_recipes_limit(
+            self.request
+        )
+        return User.objects.filter(
+            subscribtions__user=self.request.user
+        ).prefetch_related(Prefetch(
+            'recipes',
+            queryset=Recipe.objects.only(
+                'id', 'name', 'image', 'image_renditions', 'cooking_time',
+                'author_id'
+            )[:recipes_limit],
+            to_attr='limited_recipes'
+        )).order_by('id')
 
 
 class RedirectShortLinkView(View):
@@ -100,16 +223,16 @@ class RedirectShortLinkView(View):
 
     def get(self, request, short_link):
         """Обработка GET запроса через прямую ссылку на Рецепт."""
-        short_link = get_object_or_404(
-            ShortLinkRecipe,
-            short_link_code=short_link
-        )
+        recipe_id = short_links.get_recipe_id(short_link)
+        if recipe_id is None:
+            raise Http404('Ссылка не найдена.')
+        clicks.add(short_link)
         return redirect(
-            request.build_absolute_uri(f'/recipes/{short_link.recipe_id}/')
+            request.build_absolute_uri(f'/recipes/{recipe_id}/')
         )
 
 
-class IngridientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngridientsViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет запросов к Ингридиентам."""
     serializer_class = IngredientSerializer
     pagination_class = None
@@ -121,8 +244,37 @@ class IngridientsViewSet(viewsets.ReadOnlyModelViewSet):
             return Ingredient.objects.filter(pk=self.kwargs['pk'])
         return Ingredient.objects.all()
 
+    def list(self, request, *args, **kwargs):
+        """Поиск по префиксу названия выполняется по индексу в памяти."""
+        name = request.query_params.get('name')
+        if not name or 'search' in request.query_params:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(self.search_by_prefix, request)
+
+    def search_by_prefix(self, request):
+        """Ингредиенты из индекса по префиксу названия.
+
+        С параметром fuzzy=1, а также если по префиксу ничего не найдено,
+        выполняется нечёткий поиск по триграммам.
+        """
+        name = request.query_params['name']
+        ingredients = []
+        if request.query_params.get('fuzzy') != '1':
+            ingredients = ingredient_index.search(
+                name, INGREDIENT_SEARCH_LIMIT
+            )
+        if not ingredients:
+            ingredients = ingredient_index.fuzzy_search(
+                name, INGREDIENT_SEARCH_LIMIT
+            )
+        return Response(ingredients)
+
+    def get_conditional_validators(self, request):
+        snapshot = ingredient_index.refresh()
+        return f'ingredients-{snapshot.version}', snapshot.updated_at
+
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+class TagsViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет запросов к Ингридиентам."""
     serializer_class = TagSerializer
     pagination_class = None
@@ -132,19 +284,151 @@ class TagsViewSet(viewsets.ReadOnlyModelViewSet):
             return Tag.objects.filter(pk=self.kwargs['pk'])
         return Tag.objects.all()
 
+    def get_conditional_validators(self, request):
+        catalog = CatalogVersion.get(CatalogVersion.TAGS)
+        return f'tags-{catalog.version}', catalog.updated_at
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(AnonymousCacheMixin,
+                    ConditionalGetMixin,
+                    viewsets.ModelViewSet):
     """Вьюсет запросов к Рецептам."""
-    queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = (AuthorOrReadOnly,)
     pagination_class = PageLimitPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        """Кверисет Рецептов с аннотациями для текущего Пользователя.
+
+        Флаги избранного и корзины вычисляются подзапросами Exists,
+        тэги и ингредиенты подгружаются prefetch-запросами, а подписки
+        на авторов — одним запросом на всю страницу в сериализаторе,
+        поэтому число запросов на страницу списка не зависит от её размера.
+        """
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
+        if self.request.user.is_anonymous:
+            return queryset
+        return self.annotate_user_flags(queryset)
+
+    def annotate_user_flags(self, queryset):
+        """Аннотирует Рецепты флагами избранного и корзины."""
+        user = self.request.user
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        )
+
+    def get_conditional_validators(self, request):
+        """Валидаторы Рецепта или страницы списка Рецептов.
+
+        Список валидируется версиями Рецептов, справочников и авторов
+        без запросов к самим Рецептам, ответы с renditions=1 — ещё
+        и версией вариантов изображений. Для авторизованного Пользователя
+        в ETag учитываются его избранное, корзина и подписки,
+        а Last-Modified не отдаётся.
+        """
+        user = request.user
+        names = [CatalogVersion.TAGS, CatalogVersion.INGREDIENTS,
+                 CatalogVersion.AUTHORS]
+        if self.action != 'retrieve':
+            names.append(CatalogVersion.RECIPES)
+        if request.query_params.get('renditions') == '1':
+            names.append(CatalogVersion.RENDITIONS)
+        catalogs = CatalogVersion.objects.filter(
+            name__in=names
+        ).order_by('name').values_list('name', 'version', 'updated_at')
+        state = [list(catalogs)]
+
+        if self.action == 'retrieve':
+            recipes = Recipe.objects.values(
+                'updated_at', 'author__email', 'author__username',
+                'author__first_name', 'author__last_name', 'author__avatar'
+            )
+            if user.is_authenticated:
+                recipes = self.annotate_user_flags(recipes).annotate(
+                    subscribed=Exists(Subscribe.objects.filter(
+                        user=user, subscribing=OuterRef('author')
+                    ))
+                )
+            try:
+                recipe = recipes.filter(pk=self.kwargs['pk']).first()
+            except ValueError:
+                recipe = None
+            if recipe is None:
+                return None, None
+            state.append(recipe)
+        elif user.is_authenticated:
+            favorites, carts, subscriptions = (
+                model.objects.filter(user=user).order_by().values(
+                    'user'
+                ).annotate(
+                    kind=Value(model._meta.model_name),
+                    count=Count('id'),
+                    last=Max('id')
+                ).values_list('kind', 'count', 'last')
+                for model in (Favorite, ShoppingCart, Subscribe)
+            )
+            state.append(sorted(
+                favorites.union(carts, subscriptions, all=True)
+            ))
+
+        etag = md5(f'{user.pk}:{state}'.encode()).hexdigest()
+        if user.is_authenticated or self.action != 'retrieve':
+            return etag, None
+        return etag, max(
+            [recipe['updated_at']] + [catalog[2] for catalog in state[0]]
+        )
+
+    @transaction.atomic
     def perform_create(self, serializer):
         """Автор переопределяется текущим Пользователем."""
         serializer.save(author=self.request.user)
+        update_counter(User, (self.request.user.id,), 'recipes_count', 1)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        """Удаление Рецепта; его Ингредиенты вычитаются из корзин сигналом."""
+        update_counter(User, (instance.author_id,), 'recipes_count', -1)
+        instance.delete()
+
+    @action(
+        detail=False,
+        url_path='feed',
+        methods=('get',),
+        permission_classes=(IsAuthenticated,)
+    )
+    def feed(self, request):
+        """Лента Рецептов авторов, на которых подписан Пользователь."""
+        queryset = FeedEntry.get_feed(
+            request.user, self.filter_queryset(self.get_queryset())
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @staticmethod
+    def lock_user_lists(user):
+        """Блокирует строку Пользователя до конца транзакции.
+
+        Изменения избранного и корзины одного Пользователя выполняются
+        по очереди, поэтому одновременные запросы не учитывают одни
+        и те же Рецепты в счётчиках и суммах корзины дважды.
+        """
+        list(User.objects.select_for_update().filter(
+            pk=user.pk
+        ).values_list('pk', flat=True))
 
     def add_recipe(self, model, request, pk=None):
         """Добавление Рецепта."""
@@ -155,11 +439,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
             context={'request': request}
         )
         serializer.is_valid(raise_exception=True)
-        if model.objects.filter(
-            user=request.user, recipe=recipe
-        ).exists():
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        model.objects.create(user=request.user, recipe=recipe)
+        with transaction.atomic():
+            self.lock_user_lists(request.user)
+            if model is ShoppingCart:
+                Recipe.lock((recipe.id,))
+            try:
+                with transaction.atomic():
+                    model.objects.create(user=request.user, recipe=recipe)
+            except IntegrityError:
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            update_counter(Recipe, (recipe.id,), model.counter_field, 1)
+            if model is ShoppingCart:
+                ShoppingCartIngredient.add_recipes(
+                    (request.user.id,), (recipe.id,)
+                )
         modified_data = {
             **serializer.data,
             'image': request.build_absolute_uri(
@@ -171,13 +464,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def delete_recipe(self, model, request, pk=None):
         """Удаление Рецепта."""
         recipe = get_object_or_404(Recipe, id=pk)
-        shopping_cart_item = model.objects.filter(
-            user=request.user,
-            recipe=recipe
-        ).first()
-        if not shopping_cart_item:
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        shopping_cart_item.delete()
+        with transaction.atomic():
+            self.lock_user_lists(request.user)
+            if model is ShoppingCart:
+                Recipe.lock((recipe.id,))
+            if not model.objects.filter(
+                user=request.user, recipe=recipe
+            ).delete()[0]:
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            update_counter(Recipe, (recipe.id,), model.counter_field, -1)
+            if model is ShoppingCart:
+                ShoppingCartIngredient.add_recipes(
+                    (request.user.id,), (recipe.id,), sign=-1
+                )
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -206,39 +505,151 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if request.method == 'DELETE':
             return self.delete_recipe(Favorite, request, pk)
 
+    def add_recipes(self, model, request):
+        """Пакетное добавление Рецептов.
+
+        Для каждого id возвращается статус added, exists или not_found.
+        """
+        recipe_ids = self.get_batch_recipe_ids(request)
+        found = set(Recipe.objects.filter(
+            id__in=recipe_ids
+        ).values_list('id', flat=True))
+        with transaction.atomic():
+            self.lock_user_lists(request.user)
+            if model is ShoppingCart:
+                Recipe.lock(found)
+            added = found - set(model.objects.filter(
+                user=request.user, recipe_id__in=found
+            ).values_list('recipe_id', flat=True))
+            model.objects.bulk_create(
+                [model(user=request.user, recipe_id=recipe_id)
+                 for recipe_id in added],
+                ignore_conflicts=True
+            )
+            update_counter(Recipe, added, model.counter_field, 1)
+            if model is ShoppingCart and added:
+                ShoppingCartIngredient.add_recipes(
+                    (request.user.id,), added
+                )
+        return self.get_batch_response(
+            recipe_ids, found, added, 'added', 'exists'
+        )
+
+    def delete_recipes(self, model, request):
+        """Пакетное удаление Рецептов.
+
+        Для каждого id возвращается статус removed, not_in_list
+        или not_found.
+        """
+        recipe_ids = self.get_batch_recipe_ids(request)
+        with transaction.atomic():
+            self.lock_user_lists(request.user)
+            if model is ShoppingCart:
+                Recipe.lock(recipe_ids)
+            removed = set(model.objects.filter(
+                user=request.user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+            model.objects.filter(
+                user=request.user, recipe_id__in=removed
+            ).delete()
+            update_counter(Recipe, removed, model.counter_field, -1)
+            if model is ShoppingCart and removed:
+                ShoppingCartIngredient.add_recipes(
+                    (request.user.id,), removed, sign=-1
+                )
+        found = removed
+        if len(removed) < len(recipe_ids):
+            found = set(Recipe.objects.filter(
+                id__in=recipe_ids
+            ).values_list('id', flat=True))
+        return self.get_batch_response(
+            recipe_ids, found, removed, 'removed', 'not_in_list'
+        )
+
+    def get_batch_recipe_ids(self, request):
+        """Проверенный список id Рецептов пакетного запроса."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['recipes']
+
+    def get_batch_response(self, recipe_ids, found, changed,
+                           changed_status, unchanged_status):
+        """Ответ пакетного запроса со статусом для каждого id."""
+        return Response([
+            {'id': recipe_id,
+             'status': (changed_status if recipe_id in changed
+                        else unchanged_status if recipe_id in found
+                        else 'not_found')}
+            for recipe_id in recipe_ids
+        ])
+
+    @action(
+        detail=False,
+        url_path='shopping_cart',
+        methods=('post', 'delete'),
+        permission_classes=(IsAuthenticated,)
+    )
+    def batch_shopping_cart(self, request):
+        """Пакетное добавление и удаление Рецептов из Списка покупок."""
+        if request.method == 'POST':
+            return self.add_recipes(ShoppingCart, request)
+        return self.delete_recipes(ShoppingCart, request)
+
+    @action(
+        detail=False,
+        url_path='favorite',
+        methods=('post', 'delete'),
+        permission_classes=(IsAuthenticated,)
+    )
+    def batch_favorite(self, request):
+        """Пакетное добавление и удаление Рецептов из Избранного."""
+        if request.method == 'POST':
+            return self.add_recipes(Favorite, request)
+        return self.delete_recipes(Favorite, request)
+
     @action(
         detail=False,
         url_path='download_shopping_cart',
         methods=('get',),
-        permission_classes=(AuthorOrReadOnly,)
+        permission_classes=(IsAuthenticated,),
+        content_negotiation_class=IgnoreFormatParamNegotiation
     )
     def download_shopping_cart(self, request):
-        """Скачать корзинку."""
-        ingredients_in_cart = RecipeIngredient.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit',
-        ).annotate(
-            amount=Sum('amount')
-        ).order_by(
-            'ingredient__name'
-        )
-
-        shopping_list = {}
-        for item in ingredients_in_cart:
-            shopping_list[item['ingredient__name']] = (
-                f'{item["amount"]} '
-                f'{item["ingredient__measurement_unit"]}'
+        """Скачать Список покупок в формате txt, csv или json.
+
+        ETag вычисляется по состоянию корзины, поэтому повторная загрузка
+        неизменившегося Списка покупок получает ответ 304.
+        """
+        file_format = request.query_params.get('format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'format': 'Поддерживаемые форматы: '
+                           f'{", ".join(SHOPPING_LIST_FORMATS)}.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-
-        content = '\n'.join(
-            [f"{key}: {value}" for key, value in shopping_list.items()]
+        cart = ShoppingCart.objects.filter(user=request.user).aggregate(
+            count=Count('id'),
+            last=Max('id'),
+            updated_at=Max('recipe__updated_at')
+        )
+        catalog = CatalogVersion.get(CatalogVersion.INGREDIENTS)
+        etag = quote_etag(md5(
+            f'{file_format}:{cart}:{catalog.version}'.encode()
+        ).hexdigest())
+        return conditional_response(
+            request, etag, None,
+            partial(self.stream_shopping_cart, request, file_format)
         )
 
-        response = HttpResponse(content, content_type='text/plain')
-        response['Content-Disposition'] = (
-            'attachment; filename="Список_покупок.txt"'
+    def stream_shopping_cart(self, request, file_format):
+        """Потоковый ответ со Списком покупок."""
+        content_type, render = SHOPPING_LIST_FORMATS[file_format]
+        response = StreamingHttpResponse(
+            render(get_shopping_list(request.user).iterator()),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = content_disposition_header(
+            True, f'{SHOPPING_LIST_FILENAME}.{file_format}'
         )
         return response
 
@@ -249,12 +660,97 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def get_direct_link(self, request, pk):
         """Возвращает прямую ссылку на Рецепт."""
-        short_link = get_object_or_404(
-            ShortLinkRecipe,
-            recipe_id=pk
-        )
+        code = short_links.get_code(int(pk)) if pk.isdigit() else None
+        if code is None:
+            raise Http404('Ссылка не найдена.')
         return JsonResponse(
-            {"short-link": request.build_absolute_uri(
-                f'/s/{short_link.short_link_code}/'
-            )}
+            {"short-link": request.build_absolute_uri(f'/s/{code}/')}
+        )
+
+    @action(
+        detail=True,
+        url_path='link-stats',
+        methods=('get',),
+        permission_classes=(AuthorOnly,)
+    )
+    def get_link_stats(self, request, pk):
+        """Число переходов по коротким ссылкам Рецепта для его автора.
+
+        Буфер текущего процесса сбрасывается перед чтением, а переходы,
+        которые записать не удалось, добавляются к записанным.
+        """
+        if not pk.isdigit():
+            raise Http404('Рецепт не найден.')
+        recipe = get_object_or_404(Recipe, pk=pk)
+        self.check_object_permissions(request, recipe)
+        clicks.flush()
+        links = [
+            {'short-link': request.build_absolute_uri(f'/s/{code}/'),
+             'clicks': count + clicks.get_pending(code)}
+            for code, count in ShortLinkRecipe.objects.filter(
+                recipe=recipe
+            ).values_list('short_link_code', 'clicks')
+        ]
+        return Response({
+            'clicks': sum(link['clicks'] for link in links),
+            'links': links,
+        })
+
+    @action(
+        detail=False,
+        url_path='export',
+        methods=('get',),
+        permission_classes=(IsAuthenticated,),
+        content_negotiation_class=IgnoreFormatParamNegotiation
+    )
+    def bulk_export(self, request):
+        """Потоковая выгрузка Рецептов в NDJSON.
+
+        Выгрузку продолжают с параметром after — id последнего
+        полученного Рецепта.
+        """
+        params = TransferParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return StreamingHttpResponse(
+            export_recipes(params.validated_data['after']),
+            content_type='application/x-ndjson; charset=utf-8'
+        )
+
+    @action(
+        detail=False,
+        url_path='import',
+        methods=('post',),
+        permission_classes=(IsAuthenticated,)
+    )
+    def bulk_import(self, request):
+        """Потоковая загрузка Рецептов текущего Пользователя из NDJSON.
+
+        Тело читается построчно и записывается пачками в отдельных
+        транзакциях. В ответе — число обработанных строк, ошибки
+        и скорость; после сбоя загрузку продолжают с skip=lines.
+        Изображение указывается именем файла другого Рецепта или токеном
+        загрузки, новые Ингредиенты может добавлять только персонал.
+        """
+        params = TransferParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        importer = RecipeImporter(
+            request.user,
+            create_ingredients=request.user.is_staff,
+            trusted_images=False
+        )
+        try:
+            for _ in importer.run(
+                request.stream or (), params.validated_data['skip']
+            ):
+                pass
+        except DatabaseError:
+            return Response(
+                {**importer.get_report(),
+                 'detail': 'Загрузка прервана, продолжите с skip=lines.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        return Response(
+            importer.get_report(),
+            status=(status.HTTP_201_CREATED if importer.imported
+                    else status.HTTP_200_OK)
         )
@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+from api.ingredient_index import ingredient_index  # noqa: E402
+from api.short_links import clicks  # noqa: E402
+
+ingredient_index.warm_up()
+clicks.start_flushing()
@@ -4,6 +4,7 @@ from .models import (
     Ingredient,
     Recipe,
     RecipeIngredient,
+    ShoppingCartIngredient,
     ShortLinkRecipe,
     Tag,
 )
@@ -58,3 +59,19 @@ class RecipeAdmin(admin.ModelAdmin):
     list_display_links = ('name',)
     list_filter = ('tags',)
     search_fields = ('name', 'author')
+
+    def save_related(self, request, form, formsets, change):
+        """Перенос изменения Ингредиентов Рецепта в корзины."""
+        recipe_id = form.instance.pk
+        old_amounts = (
+            ShoppingCartIngredient.get_recipe_amounts(recipe_id)
+            if change else {}
+        )
+        super().save_related(request, form, formsets, change)
+        ShoppingCartIngredient.apply_recipe(
+            recipe_id,
+            ShoppingCartIngredient.get_amounts_delta(
+                old_amounts,
+                ShoppingCartIngredient.get_recipe_amounts(recipe_id)
+            )
+        )
@@ -1,4 +1,28 @@
+import string
+
 CHARFIELD_MAX_LENGTH = 256
 INTEGER_FIELD_MAX_VALUE = 32000
 INTEGER_FIELD_MIN_VALUE = 1
-SHORTLINK_MAX_LENGTH = 10
+SHORTLINK_ALPHABET = string.digits + string.ascii_letters
+FEED_FANOUT_MAX_SUBSCRIBERS = 1000
+FEED_BACKFILL_RECIPES = 50
+IMAGE_RENDITIONS = (
+    ('thumbnail', 480, 'JPEG'),
+    ('thumbnail_webp', 480, 'WEBP'),
+    ('webp', 1280, 'WEBP'),
+)
+IMAGE_RENDITION_QUALITY = 80
+IMAGE_RENDITION_WORKERS = 2
+UPLOAD_TOKEN_LENGTH = 64
+UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+UPLOAD_EXPIRE_SECONDS = 24 * 60 * 60
+UPLOAD_MAX_OPEN_PER_USER = 10
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'RIFF', 'webp'),
+)
+IMAGE_HEADER_LENGTH = 12
+TRANSFER_BATCH_SIZE = 500
@@ -0,0 +1,117 @@
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+SERVERS = {
+    'wsgi': ('gunicorn', '--bind', '127.0.0.1:{port}', 'backend.wsgi'),
+    'asgi': ('uvicorn', 'backend.asgi:application',
+             '--host', '127.0.0.1', '--port', '{port}'),
+}
+DEFAULT_PATHS = ('/api/recipes/', '/api/tags/', '/api/ingredients/')
+STARTUP_TIMEOUT_SECONDS = 30
+
+
+def fetch(request):
+    """Время ответа на GET-запрос или None при ошибке."""
+    started = time.perf_counter()
+    try:
+        with urlopen(request) as response:
+            response.read()
+    except (HTTPError, URLError, OSError):
+        return None
+    return time.perf_counter() - started
+
+
+def get_percentile(values, percent):
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class Command(BaseCommand):
+    help = ('Сравнение пропускной способности режимов WSGI (gunicorn) '
+            'и ASGI (uvicorn) на одинаковых числе воркеров '
+            'и конкурентности запросов. Анонимные ответы Рецептов '
+            'и Тэгов берутся из кэша; чтобы измерить запросы к базе, '
+            'передайте --token: адреса будут дополнительно нагружены '
+            'запросами с токеном, которые кэш не обслуживает.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Адрес для нагрузки; можно указать несколько раз.'
+        )
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--port', type=int, default=8100)
+        parser.add_argument(
+            '--token',
+            help='Токен Пользователя для запросов в обход кэша ответов.'
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or DEFAULT_PATHS
+        headers = [('', {})]
+        if options['token']:
+            headers.append((
+                ' (токен)', {'Authorization': f'Token {options["token"]}'}
+            ))
+        self.stdout.write(
+            f'{"режим":<6}{"адрес":<40}{"запросов/с":>12}'
+            f'{"p50, мс":>10}{"p95, мс":>10}{"ошибок":>8}'
+        )
+        for mode, command in SERVERS.items():
+            base_url = f'http://127.0.0.1:{options["port"]}'
+            server = subprocess.Popen(
+                [part.format(port=options['port']) for part in command],
+                env={**os.environ,
+                     'SERVER_MODE': mode,
+                     'WEB_CONCURRENCY': str(options['workers'])},
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+            try:
+                self.wait_ready(server, base_url + paths[0])
+                for path in paths:
+                    for label, path_headers in headers:
+                        self.report(mode, path + label, self.load(
+                            Request(base_url + path, headers=path_headers),
+                            options['requests'],
+                            options['concurrency']
+                        ))
+            finally:
+                server.terminate()
+                server.wait()
+
+    def wait_ready(self, server, url):
+        deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+        while fetch(url) is None:
+            if server.poll() is not None or time.monotonic() > deadline:
+                raise CommandError(
+                    f'Сервер {" ".join(server.args)} не запустился.'
+                )
+            time.sleep(0.5)
+
+    def load(self, request, requests, concurrency):
+        """Прогон requests запросов в concurrency потоков."""
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            timings = list(executor.map(fetch, [request] * requests))
+        elapsed = time.perf_counter() - started
+        succeeded = sorted(timing for timing in timings if timing is not None)
+        return elapsed, succeeded, len(timings) - len(succeeded)
+
+    def report(self, mode, path, result):
+        elapsed, timings, errors = result
+        if not timings:
+            self.stdout.write(f'{mode:<6}{path:<40}{"—":>12}{errors:>28}')
+            return
+        self.stdout.write(
+            f'{mode:<6}{path:<40}{len(timings) / elapsed:>12.0f}'
+            f'{get_percentile(timings, 50) * 1000:>10.1f}'
+            f'{get_percentile(timings, 95) * 1000:>10.1f}{errors:>8}'
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.renditions import create_renditions
+
+
+class Command(BaseCommand):
+    help = ('Создание уменьшенных копий и WebP-вариантов изображений '
+            'Рецептов, у которых их ещё нет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать варианты для всех Рецептов.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only(
+            'id', 'image', 'image_renditions'
+        )
+        if not options['force']:
+            recipes = recipes.filter(image_renditions={})
+        created = failed = 0
+        for recipe in recipes.iterator():
+            try:
+                create_renditions(recipe)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe.id}: {error}')
+            else:
+                created += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Варианты созданы для {created} Рецептов, ошибок: {failed}.'
+        ))
@@ -0,0 +1,48 @@
+import sys
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from recipes.constants import TRANSFER_BATCH_SIZE
+from recipes.transfer import export_recipes
+
+
+class Command(BaseCommand):
+    help = ('Потоковая выгрузка Рецептов в NDJSON; выгрузку продолжают '
+            'с последнего выгруженного id.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', type=Path,
+            help='Файл выгрузки; по умолчанию стандартный вывод.'
+        )
+        parser.add_argument(
+            '--after', type=int, default=0,
+            help='Выгрузить Рецепты с id больше указанного и дописать файл.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=TRANSFER_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        lines = export_recipes(options['after'], options['batch_size'])
+        if options['path'] is None:
+            count = self.write(sys.stdout, lines)
+        else:
+            mode = 'a' if options['after'] else 'w'
+            with open(options['path'], mode, encoding='utf-8') as file:
+                count = self.write(file, lines)
+        elapsed = time.perf_counter() - started
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено {count} рецептов за {elapsed:.2f} с '
+            f'({count / elapsed:.0f} рецептов/с).'
+        ))
+
+    def write(self, file, lines):
+        count = 0
+        for line in lines:
+            file.write(line)
+            count += 1
+        return count
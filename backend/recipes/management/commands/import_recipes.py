@@ -0,0 +1,63 @@
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.constants import TRANSFER_BATCH_SIZE
+from recipes.transfer import RecipeImporter
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Потоковая загрузка Рецептов из NDJSON пачками; после сбоя '
+            'загрузку продолжают с --skip.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path)
+        parser.add_argument(
+            '--author',
+            help='Email автора всех Рецептов; по умолчанию поле author.'
+        )
+        parser.add_argument(
+            '--skip', type=int, default=0,
+            help='Пропустить уже загруженные строки.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=TRANSFER_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        if not options['path'].exists():
+            raise CommandError(f'Файл {options["path"]} не найден.')
+        author = None
+        if options['author']:
+            author = User.objects.filter(email=options['author']).first()
+            if author is None:
+                raise CommandError(
+                    f'Пользователь {options["author"]} не найден.'
+                )
+        importer = RecipeImporter(author, options['batch_size'])
+        with open(options['path'], 'rb') as file:
+            try:
+                for progress in importer.run(file, options['skip']):
+                    self.stdout.write(
+                        f'Строк {progress.lines}, загружено '
+                        f'{progress.imported} ({progress.rate:.0f} '
+                        f'рецептов/с).'
+                    )
+            except Exception as error:
+                raise CommandError(
+                    f'{error}. Загрузка прервана, продолжить: '
+                    f'--skip {importer.lines}.'
+                )
+        for error in importer.errors:
+            self.stdout.write(self.style.WARNING(
+                f'Строка {error["line"]}: {error["error"]}'
+            ))
+        report = importer.get_report()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено {report["imported"]} рецептов из {report["lines"]} '
+            f'строк за {report["seconds"]:.2f} с '
+            f'({report["recipes_per_second"]:.0f} рецептов/с).'
+        ))
@@ -0,0 +1,254 @@
+import csv
+import io
+import json
+import time
+from collections import defaultdict
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.dispatch import Signal
+
+from recipes.models import CatalogVersion, Ingredient, Tag
+
+CATALOGS = {
+    'ingredients': (Ingredient, ('name', 'measurement_unit'),
+                    ('name', 'measurement_unit'), CatalogVersion.INGREDIENTS),
+    'tags': (Tag, ('name', 'slug'), ('name',), CatalogVersion.TAGS),
+}
+READ_CHUNK_SIZE = 64 * 1024
+
+# Отправляется после загрузки: массовые INSERT не вызывают post_save.
+catalog_loaded = Signal()
+
+
+def iter_csv(file, fields):
+    """Строки CSV-файла как словари, строка заголовка пропускается."""
+    for row in csv.reader(file):
+        if not row or tuple(row) == fields:
+            continue
+        yield dict(zip(fields, row))
+
+
+def iter_json(file):
+    """Объекты JSON-массива (или JSON Lines), читаемые по частям."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    while True:
+        chunk = file.read(READ_CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while (position < len(buffer)
+                   and buffer[position] in '[], \t\r\n'):
+                position += 1
+            if position == len(buffer):
+                break
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            yield item
+            position = end
+        if not chunk:
+            return
+
+
+def iter_batches(rows, size):
+    """Разбиение потока строк на пачки."""
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ('Потоковая загрузка справочников Ингредиентов и Тэгов из CSV '
+            'и JSON. Существующие строки находятся по названию Тэга '
+            'или по названию и единице измерения Ингредиента: у Тэгов '
+            'обновляется слаг, дубликаты Ингредиентов пропускаются. '
+            'Строки со слагом, занятым другим Тэгом, пропускаются '
+            'и выводятся в stderr.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', type=Path)
+        parser.add_argument(
+            '--catalog', choices=CATALOGS,
+            help='Справочник; по умолчанию определяется по имени файла.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            catalog = options['catalog'] or (
+                'tags' if 'tag' in path.name.lower() else 'ingredients'
+            )
+            if not path.exists():
+                raise CommandError(f'Файл {path} не найден.')
+            self.load(path, catalog, options['batch_size'])
+
+    def load(self, path, catalog, batch_size):
+        """Загрузка одного файла в справочник."""
+        model, fields, unique_fields, version_name = CATALOGS[catalog]
+        started = time.perf_counter()
+        read = changed = skipped = 0
+        taken = defaultdict(dict)
+        with open(path, encoding='utf-8', newline='') as file, \
+                transaction.atomic():
+            if path.suffix.lower() == '.csv':
+                items = iter_csv(file, fields)
+            else:
+                items = iter_json(file)
+            rows = self.unique_rows(items, fields, unique_fields)
+            for batch in iter_batches(rows, batch_size):
+                read += len(batch)
+                kept = self.skip_conflicts(
+                    model, fields, unique_fields, batch, taken
+                )
+                skipped += len(batch) - len(kept)
+                batch = kept
+                if not batch:
+                    continue
+                if connection.vendor == 'postgresql':
+                    changed += self.copy_batch(
+                        model, fields, unique_fields, batch
+                    )
+                else:
+                    changed += self.save_batch(
+                        model, fields, unique_fields, batch
+                    )
+            if changed:
+                CatalogVersion.bump(version_name)
+                catalog_loaded.send(sender=model)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{path}: прочитано {read}, добавлено и изменено {changed}, '
+            f'пропущено {skipped} за {elapsed:.2f} с '
+            f'({read / elapsed:.0f} строк/с).'
+        ))
+
+    def unique_rows(self, items, fields, unique_fields):
+        """Кортежи значений полей без повторов ключа внутри файла."""
+        key_indexes = [fields.index(field) for field in unique_fields]
+        seen = set()
+        for item in items:
+            row = tuple(str(item[field]).strip() for field in fields)
+            key = tuple(row[index] for index in key_indexes)
+            if key not in seen:
+                seen.add(key)
+                yield row
+
+    def skip_conflicts(self, model, fields, unique_fields, batch, taken):
+        """Строки пачки без конфликтов по остальным уникальным полям.
+
+        Например, слаг нового Тэга может быть уже занят другим Тэгом:
+        такая строка нарушила бы ограничение и откатила бы загрузку
+        всего файла, поэтому она пропускается с сообщением. taken —
+        владельцы значений {поле: {значение: ключ}} по базе и уже
+        принятым строкам файла.
+        """
+        checked = [
+            field for field in fields
+            if field not in unique_fields
+            and model._meta.get_field(field).unique
+        ]
+        if not checked:
+            return batch
+        key_indexes = [fields.index(field) for field in unique_fields]
+        for field in checked:
+            index = fields.index(field)
+            for value, *key in model.objects.filter(**{
+                f'{field}__in': {row[index] for row in batch}
+            }).values_list(field, *unique_fields):
+                taken[field].setdefault(value, tuple(key))
+        kept = []
+        for row in batch:
+            key = tuple(row[index] for index in key_indexes)
+            conflicts = [
+                field for field in checked
+                if taken[field].get(row[fields.index(field)], key) != key
+            ]
+            if conflicts:
+                self.stderr.write(
+                    f'{dict(zip(fields, row))}: ' + ', '.join(
+                        f'{field} {row[fields.index(field)]} уже занят '
+                        f'строкой {taken[field][row[fields.index(field)]]}'
+                        for field in conflicts
+                    )
+                )
+                continue
+            for field in checked:
+                taken[field][row[fields.index(field)]] = key
+            kept.append(row)
+        return kept
+
+    def save_batch(self, model, fields, unique_fields, batch):
+        """Загрузка пачки через bulk_create; возвращает число изменений."""
+        existing = set(model.objects.filter(**{
+            f'{unique_fields[0]}__in': {
+                row[fields.index(unique_fields[0])] for row in batch
+            }
+        }).values_list(*fields))
+        update_fields = [
+            field for field in fields if field not in unique_fields
+        ]
+        model.objects.bulk_create(
+            [model(**dict(zip(fields, row))) for row in batch],
+            ignore_conflicts=not update_fields,
+            update_conflicts=bool(update_fields),
+            unique_fields=unique_fields if update_fields else None,
+            update_fields=update_fields or None
+        )
+        return sum(row not in existing for row in batch)
+
+    def copy_batch(self, model, fields, unique_fields, batch):
+        """Загрузка пачки через COPY во временную таблицу и INSERT.
+
+        Строки с существующим ключом обновляются, только если значения
+        отличаются, поэтому число строк INSERT равно числу изменений.
+        """
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)
+
+        def get_columns(names):
+            return [quote(model._meta.get_field(name).column)
+                    for name in names]
+
+        columns = ', '.join(get_columns(fields))
+        update_columns = get_columns(
+            field for field in fields if field not in unique_fields
+        )
+        if update_columns:
+            conflict = (
+                f'ON CONFLICT ({", ".join(get_columns(unique_fields))}) '
+                f'DO UPDATE SET ' + ', '.join(
+                    f'{column} = EXCLUDED.{column}'
+                    for column in update_columns
+                ) + ' WHERE ' + ' OR '.join(
+                    f'{table}.{column} IS DISTINCT FROM EXCLUDED.{column}'
+                    for column in update_columns
+                )
+            )
+        else:
+            conflict = 'ON CONFLICT DO NOTHING'
+        data = io.StringIO()
+        csv.writer(data).writerows(batch)
+        data.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE IF NOT EXISTS load_catalog '
+                f'ON COMMIT DROP AS SELECT {columns} FROM {table} '
+                f'WITH NO DATA'
+            )
+            cursor.execute('TRUNCATE load_catalog')
+            cursor.copy_expert(
+                f'COPY load_catalog ({columns}) FROM STDIN WITH CSV', data
+            )
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) '
+                f'SELECT {columns} FROM load_catalog {conflict}'
+            )
+            return cursor.rowcount
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = ('Проверка сумм Ингредиентов в корзинах и их пересчёт '
+            'по Рецептам из Списков покупок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сообщить о расхождениях, не пересчитывая.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            expected = {
+                (user_id, ingredient_id): total_amount
+                for user_id, ingredient_id, total_amount
+                in ShoppingCartIngredient.get_expected()
+            }
+            stored = {
+                (user_id, ingredient_id): total_amount
+                for user_id, ingredient_id, total_amount
+                in ShoppingCartIngredient.objects.values_list(
+                    'user_id', 'ingredient_id', 'total_amount'
+                )
+            }
+            mismatched = {
+                key for key in expected.keys() | stored.keys()
+                if expected.get(key) != stored.get(key)
+            }
+            users = sorted({user_id for user_id, _ in mismatched})
+            if users and not options['check']:
+                ShoppingCartIngredient.rebuild(users)
+        message = (f'Расхождений: {len(mismatched)} '
+                   f'у {len(users)} пользователей.')
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS(message))
+        elif options['check']:
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{message} Пересчитано.'))
@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscribe
+
+User = get_user_model()
+
+COUNTERS = (
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscribe, 'subscribing'),
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+)
+
+
+def get_actual_count(related_model, lookup):
+    """Подзапрос с фактическим числом связанных объектов."""
+    return Coalesce(Subquery(
+        related_model.objects.filter(
+            **{lookup: OuterRef('pk')}
+        ).order_by().values(lookup).annotate(
+            count=Count('pk')
+        ).values('count')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ('Сверка счётчиков рецептов, подписчиков, избранного и корзин '
+            'с фактическими данными и исправление расхождений.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сообщить о расхождениях, не исправляя.'
+        )
+
+    def handle(self, *args, **options):
+        for model, field, related_model, lookup in COUNTERS:
+            actual = get_actual_count(related_model, lookup)
+            with transaction.atomic():
+                drifted = list(model.objects.annotate(
+                    actual=actual
+                ).exclude(
+                    **{field: F('actual')}
+                ).values_list('pk', flat=True))
+                if drifted and not options['check']:
+                    model.objects.filter(pk__in=drifted).update(
+                        **{field: actual}
+                    )
+            message = (f'{model._meta.model_name}.{field}: '
+                       f'расхождений {len(drifted)}.')
+            if drifted and options['check']:
+                self.stdout.write(self.style.WARNING(message))
+            else:
+                self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:28
+
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    """Слияние повторов (name, measurement_unit) перед ограничением.
+
+    Строки Рецептов переносятся на первый из одинаковых Ингредиентов,
+    а остальные удаляются. Суммы корзин заполняются миграцией 0006
+    уже по перенесённым строкам. Отложенные проверки внешних ключей
+    выполняются сразу, иначе PostgreSQL не даст изменить таблицу
+    Ингредиентов в той же транзакции.
+    """
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).order_by().annotate(
+        first_id=models.Min('id'), count=models.Count('id')
+    ).filter(count__gt=1)
+    for row in duplicates:
+        duplicate_ids = Ingredient.objects.filter(
+            name=row['name'], measurement_unit=row['measurement_unit']
+        ).exclude(id=row['first_id']).values_list('id', flat=True)
+        RecipeIngredient.objects.filter(
+            ingredient_id__in=duplicate_ids
+        ).update(ingredient_id=row['first_id'])
+        Ingredient.objects.filter(id__in=list(duplicate_ids)).delete()
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='ingredient',
+            unique_together={('name', 'measurement_unit')},
+        ),
+    ]
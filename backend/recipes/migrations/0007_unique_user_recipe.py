@@ -0,0 +1,69 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def delete_duplicates(apps, schema_editor):
+    """Удаление повторов (user, recipe) перед созданием ограничений.
+
+    Суммы Ингредиентов в корзинах Пользователей, у которых были
+    повторы, пересчитываются.
+    """
+    for model_name in ('Favorite', 'ShoppingCart'):
+        model = apps.get_model('recipes', model_name)
+        duplicates = model.objects.values('user_id', 'recipe_id').annotate(
+            first_id=models.Min('id'), count=models.Count('id')
+        ).filter(count__gt=1)
+        user_ids = set()
+        for row in duplicates:
+            model.objects.filter(
+                user_id=row['user_id'], recipe_id=row['recipe_id']
+            ).exclude(id=row['first_id']).delete()
+            user_ids.add(row['user_id'])
+        if model_name == 'ShoppingCart' and user_ids:
+            rebuild_cart_ingredients(apps, user_ids)
+
+
+def rebuild_cart_ingredients(apps, user_ids):
+    """Пересчёт сумм Ингредиентов в корзинах Пользователей."""
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartIngredient = apps.get_model(
+        'recipes', 'ShoppingCartIngredient'
+    )
+    ShoppingCartIngredient.objects.filter(user_id__in=user_ids).delete()
+    ShoppingCartIngredient.objects.bulk_create(
+        ShoppingCartIngredient(
+            user_id=row['user_id'],
+            ingredient_id=row['ingredient_id'],
+            total_amount=row['total_amount']
+        )
+        for row in RecipeIngredient.objects.filter(
+            recipe__shopping_cart__user_id__in=user_ids
+        ).values(
+            'ingredient_id',
+            user_id=models.F('recipe__shopping_cart__user_id'),
+        ).annotate(
+            total_amount=models.Sum('amount')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0006_shoppingcartingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='favorite',
+            unique_together={('user', 'recipe')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='shoppingcart',
+            unique_together={('user', 'recipe')},
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:37
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('users', 'FoodgramUser', 'recipes_count', 'recipes', 'Recipe',
+     'author'),
+    ('users', 'FoodgramUser', 'followers_count', 'users', 'Subscribe',
+     'subscribing'),
+    ('recipes', 'Recipe', 'favorites_count', 'recipes', 'Favorite',
+     'recipe'),
+    ('recipes', 'Recipe', 'in_carts_count', 'recipes', 'ShoppingCart',
+     'recipe'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    """Заполнение счётчиков по существующим данным."""
+    for (app_label, model_name, field,
+         related_app_label, related_model_name, lookup) in COUNTERS:
+        related_model = apps.get_model(related_app_label, related_model_name)
+        apps.get_model(app_label, model_name).objects.update(**{
+            field: Coalesce(models.Subquery(
+                related_model.objects.filter(
+                    **{lookup: models.OuterRef('pk')}
+                ).order_by().values(lookup).annotate(
+                    count=models.Count('pk')
+                ).values('count')
+            ), 0)
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_unique_user_recipe'),
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shortlinkrecipe',
+            name='clicks',
+            field=models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Переходы'),
+        ),
+    ]
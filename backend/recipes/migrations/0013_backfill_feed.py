@@ -0,0 +1,47 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:12
+
+from django.db import migrations
+
+from recipes.constants import FEED_BACKFILL_RECIPES
+
+
+def backfill_feed(apps, schema_editor):
+    """Заполнение лент по существующим подпискам.
+
+    Как и FeedEntry.backfill, в ленты подписчиков авторов с раскладкой
+    добавляются последние FEED_BACKFILL_RECIPES Рецептов автора.
+    """
+    Subscribe = apps.get_model('users', 'Subscribe')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    author_ids = Subscribe.objects.filter(
+        subscribing__feed_pull=False
+    ).order_by().values_list('subscribing_id', flat=True).distinct()
+    for author_id in author_ids.iterator():
+        recipe_ids = list(Recipe.objects.filter(
+            author_id=author_id
+        ).order_by('-id').values_list('id', flat=True)[
+            :FEED_BACKFILL_RECIPES
+        ])
+        if not recipe_ids:
+            continue
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(user_id=user_id, recipe_id=recipe_id)
+             for user_id in Subscribe.objects.filter(
+                 subscribing_id=author_id
+             ).values_list('user_id', flat=True)
+             for recipe_id in recipe_ids],
+            ignore_conflicts=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_imageupload'),
+        ('users', '0003_foodgramuser_feed_pull'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_feed, migrations.RunPython.noop),
+    ]
@@ -1,18 +1,42 @@
-import shortuuid
+import os
+from collections import Counter
+from datetime import timedelta
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.dispatch import receiver
-from django.db import IntegrityError, models
+from django.db import models, transaction
+from django.db.models.functions import Greatest
+from django.utils import timezone
 
 from .constants import (CHARFIELD_MAX_LENGTH,
+                        FEED_BACKFILL_RECIPES,
+                        FEED_FANOUT_MAX_SUBSCRIBERS,
+                        IMAGE_SIGNATURES,
                         INTEGER_FIELD_MAX_VALUE,
                         INTEGER_FIELD_MIN_VALUE,
-                        SHORTLINK_MAX_LENGTH)
+                        SHORTLINK_ALPHABET,
+                        UPLOAD_EXPIRE_SECONDS,
+                        UPLOAD_TOKEN_LENGTH)
+from users.models import Subscribe
 
 User = get_user_model()
 
 
+def update_counter(model, pks, field, delta):
+    """Атомарно изменяет счётчик field у объектов model на delta.
+
+    Уменьшение не опускает счётчик ниже нуля, если он разошёлся
+    с данными; расхождения исправляет команда reconcile_counters.
+    """
+    value = models.F(field) + delta
+    if delta < 0:
+        value = Greatest(value, 0)
+    model.objects.filter(pk__in=pks).update(**{field: value})
+
+
 class Tag(models.Model):
     """Модель Тэга."""
     name = models.CharField(
@@ -35,6 +59,56 @@ class Tag(models.Model):
         return self.name
 
 
+class CatalogVersion(models.Model):
+    """Модель версии справочника Тэгов или Ингредиентов.
+
+    Версия увеличивается при любом изменении справочника и служит
+    валидатором для условных GET-запросов. Так же версионируются
+    Рецепты, данные их авторов и варианты изображений, чтобы валидаторы
+    списка не требовали агрегата по Рецептам.
+    """
+    TAGS = 'tags'
+    INGREDIENTS = 'ingredients'
+    RECIPES = 'recipes'
+    AUTHORS = 'authors'
+    RENDITIONS = 'renditions'
+
+    name = models.CharField(
+        max_length=CHARFIELD_MAX_LENGTH,
+        unique=True,
+        verbose_name='Справочник'
+    )
+    version = models.PositiveIntegerField(
+        default=1,
+        verbose_name='Версия'
+    )
+    updated_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Дата изменения'
+    )
+
+    class Meta:
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочников'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
+
+    @classmethod
+    def get(cls, name):
+        """Возвращает текущую версию справочника."""
+        return cls.objects.get_or_create(name=name)[0]
+
+    @classmethod
+    def bump(cls, name):
+        """Увеличивает версию справочника."""
+        if not cls.objects.filter(name=name).update(
+            version=models.F('version') + 1,
+            updated_at=timezone.now()
+        ):
+            cls.objects.get_or_create(name=name)
+
+
 class Ingredient(models.Model):
     """Модель Ингридиента."""
     name = models.CharField(
@@ -50,11 +124,26 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ['name']
+        unique_together = ('name', 'measurement_unit')
 
     def __str__(self):
         return self.name
 
 
+@receiver(models.signals.post_save, sender=Tag)
+@receiver(models.signals.post_delete, sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    """Увеличение версии справочника Тэгов при его изменении."""
+    CatalogVersion.bump(CatalogVersion.TAGS)
+
+
+@receiver(models.signals.post_save, sender=Ingredient)
+@receiver(models.signals.post_delete, sender=Ingredient)
+def bump_ingredients_version(sender, **kwargs):
+    """Увеличение версии справочника Ингредиентов при его изменении."""
+    CatalogVersion.bump(CatalogVersion.INGREDIENTS)
+
+
 class Recipe(models.Model):
     """Модель Рецепта."""
     author = models.ForeignKey(
@@ -82,6 +171,30 @@ class Recipe(models.Model):
             MaxValueValidator(limit_value=INTEGER_FIELD_MAX_VALUE)
         ]
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+    image_renditions = models.JSONField(
+        default=dict,
+        editable=False,
+        verbose_name='Варианты изображения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В корзинах'
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -91,6 +204,96 @@ class Recipe(models.Model):
     def __str__(self):
         return self.name
 
+    def get_file_names(self):
+        """Имена файлов изображения Рецепта и его вариантов."""
+        names = list(self.image_renditions.values())
+        if self.image:
+            names.append(self.image.name)
+        return names
+
+    def delete_files_on_commit(self, names):
+        """Удаляет файлы из хранилища после фиксации транзакции."""
+        storage = self.image.storage
+
+        def delete_files():
+            for name in names:
+                storage.delete(name)
+
+        transaction.on_commit(delete_files)
+
+    @classmethod
+    def lock(cls, recipe_ids):
+        """Блокирует строки Рецептов до конца транзакции.
+
+        Изменение состава Рецепта и изменение корзин с ним выполняются
+        по очереди: иначе одно из них прочитает состав или корзины
+        до фиксации другого, и суммы корзин разойдутся. Строки
+        блокируются по возрастанию id, чтобы пакетные запросы
+        не блокировали друг друга взаимно.
+        """
+        list(cls.objects.select_for_update().filter(
+            pk__in=recipe_ids
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def set_ingredients(self, amounts, created=False):
+        """Приводит Ингредиенты Рецепта к amounts {id Ингредиента: кол-во}.
+
+        Изменяются только отличающиеся строки: одним DELETE, одним
+        UPDATE и одним INSERT. Загруженные prefetch-запросом строки
+        используются повторно. Возвращает изменение количеств
+        для корзин Пользователей.
+        """
+        rows = [] if created else self.recipe_ingredient.all()
+        old_amounts = Counter()
+        kept = {}
+        removed = []
+        for row in rows:
+            old_amounts[row.ingredient_id] += row.amount
+            if row.ingredient_id in amounts and row.ingredient_id not in kept:
+                kept[row.ingredient_id] = row
+            else:
+                removed.append(row.pk)
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        changed = []
+        for ingredient_id, row in kept.items():
+            if row.amount != amounts[ingredient_id]:
+                row.amount = amounts[ingredient_id]
+                changed.append(row)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=self, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in kept
+        )
+        return {
+            ingredient_id: amounts.get(ingredient_id, 0) - old_amounts[
+                ingredient_id
+            ]
+            for ingredient_id in old_amounts.keys() | amounts.keys()
+        }
+
+    def set_tags(self, tag_ids, created=False):
+        """Приводит Тэги Рецепта к tag_ids без повторной загрузки Тэгов."""
+        through = Recipe.tags.through.objects
+        old_ids = set() if created else {tag.id for tag in self.tags.all()}
+        removed_ids = old_ids.difference(tag_ids)
+        if removed_ids:
+            through.filter(recipe=self, tag_id__in=removed_ids).delete()
+        through.bulk_create(
+            through.model(recipe=self, tag_id=tag_id)
+            for tag_id in tag_ids if tag_id not in old_ids
+        )
+
+
+@receiver(models.signals.post_delete, sender=Recipe)
+def delete_recipe_files(sender, instance, **kwargs):
+    """Освобождение изображений удалённого Рецепта."""
+    instance.delete_files_on_commit(instance.get_file_names())
+
 
 class RecipeIngredient(models.Model):
     """Модель, определяющая количество ингридиента для рецепта."""
@@ -120,8 +323,28 @@ class RecipeIngredient(models.Model):
         return f'{self.ingredient.name}, {self.ingredient.measurement_unit}'
 
 
+@receiver(models.signals.post_save, sender=Recipe)
+@receiver(models.signals.post_delete, sender=Recipe)
+def bump_recipes_version(sender, **kwargs):
+    """Увеличение версии Рецептов при их изменении.
+
+    Ингредиенты и Тэги Рецепта меняются вместе с сохранением Рецепта.
+    """
+    CatalogVersion.bump(CatalogVersion.RECIPES)
+
+
+@receiver(models.signals.post_save, sender=User)
+def bump_authors_version(sender, created, update_fields, **kwargs):
+    """Увеличение версии авторов при изменении данных Пользователя."""
+    if created or update_fields and set(update_fields) == {'last_login'}:
+        return
+    CatalogVersion.bump(CatalogVersion.AUTHORS)
+
+
 class ShoppingCart(models.Model):
     """Модель Списка покупок."""
+    counter_field = 'in_carts_count'
+
     user = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='cart_user',
@@ -138,13 +361,167 @@ class ShoppingCart(models.Model):
         verbose_name = 'Рецепт в корзине'
         verbose_name_plural = 'Рецепты в корзине'
         ordering = ['user']
+        unique_together = ('user', 'recipe')
 
     def __str__(self):
         return self.recipe.name
 
 
+class ShoppingCartIngredient(models.Model):
+    """Модель суммарного количества Ингредиента в корзине Пользователя.
+
+    Материализованная сумма RecipeIngredient по Рецептам из корзины,
+    которая обновляется в одной транзакции с изменением корзины или
+    состава Рецепта.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Кол-во'
+    )
+
+    class Meta:
+        verbose_name = 'Ингредиент в корзине'
+        verbose_name_plural = 'Ингредиенты в корзине'
+        unique_together = ('user', 'ingredient')
+
+    def __str__(self):
+        return f'{self.ingredient.name}: {self.total_amount}'
+
+    @staticmethod
+    def get_recipe_amounts(*recipe_ids):
+        """Количества Ингредиентов Рецептов по id Ингредиента."""
+        return dict(RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by().values('ingredient_id').annotate(
+            total=models.Sum('amount')
+        ).values_list('ingredient_id', 'total'))
+
+    @staticmethod
+    def get_amounts_delta(old, new):
+        """Разница количеств Ингредиентов до и после изменения."""
+        return {
+            ingredient_id: new.get(ingredient_id, 0) - old.get(
+                ingredient_id, 0
+            )
+            for ingredient_id in old.keys() | new.keys()
+        }
+
+    @classmethod
+    def apply(cls, user_ids, amounts):
+        """Прибавляет количества Ингредиентов к корзинам Пользователей.
+
+        amounts — словарь {id Ингредиента: изменение количества},
+        отрицательные значения вычитаются, обнулившиеся строки удаляются.
+        Сумма не опускается ниже нуля, даже если разошлась с корзиной.
+        """
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount
+        }
+        user_ids = list(user_ids)
+        if not amounts or not user_ids:
+            return
+        cls.objects.bulk_create(
+            [cls(user_id=user_id, ingredient_id=ingredient_id)
+             for user_id in user_ids
+             for ingredient_id, amount in amounts.items() if amount > 0],
+            ignore_conflicts=True
+        )
+        rows = cls.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=amounts
+        )
+        rows.update(total_amount=Greatest(
+            models.F('total_amount') + models.Case(
+                *(models.When(ingredient_id=ingredient_id, then=amount)
+                  for ingredient_id, amount in amounts.items()),
+                output_field=models.IntegerField()
+            ),
+            0
+        ))
+        if min(amounts.values()) < 0:
+            rows.filter(total_amount__lte=0).delete()
+
+    @classmethod
+    def apply_recipe(cls, recipe_id, amounts):
+        """Переносит изменение состава Рецепта в корзины с этим Рецептом."""
+        cls.apply(
+            ShoppingCart.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('user_id', flat=True),
+            amounts
+        )
+
+    @classmethod
+    def add_recipes(cls, user_ids, recipe_ids, sign=1):
+        """Добавляет Рецепты в корзины (sign=-1 — убирает из корзин)."""
+        cls.apply(user_ids, {
+            ingredient_id: sign * amount
+            for ingredient_id, amount in cls.get_recipe_amounts(
+                *recipe_ids
+            ).items()
+        })
+
+    @staticmethod
+    def get_expected(user_ids=None):
+        """Суммы, вычисленные заново по корзинам Пользователей."""
+        if user_ids is None:
+            lookup = {'recipe__shopping_cart__isnull': False}
+        else:
+            lookup = {'recipe__shopping_cart__user_id__in': user_ids}
+        return RecipeIngredient.objects.filter(**lookup).values(
+            'ingredient_id',
+            user_id=models.F('recipe__shopping_cart__user_id'),
+        ).annotate(
+            total_amount=models.Sum('amount')
+        ).values_list('user_id', 'ingredient_id', 'total_amount')
+
+    @classmethod
+    def rebuild(cls, user_ids=None):
+        """Пересчитывает суммы по корзинам Пользователей."""
+        rows = cls.objects.all()
+        if user_ids is not None:
+            rows = rows.filter(user_id__in=user_ids)
+        rows.delete()
+        cls.objects.bulk_create(
+            cls(user_id=user_id, ingredient_id=ingredient_id,
+                total_amount=total_amount)
+            for user_id, ingredient_id, total_amount in cls.get_expected(
+                user_ids
+            )
+        )
+
+
+@receiver(models.signals.pre_delete, sender=Recipe)
+def remove_recipe_from_carts(sender, instance, **kwargs):
+    """Вычитание Ингредиентов удаляемого Рецепта из корзин.
+
+    Срабатывает и при удалении из админки, и при каскадном удалении
+    Рецептов вместе с автором, пока строки Рецепта ещё существуют.
+    """
+    ShoppingCartIngredient.add_recipes(
+        ShoppingCart.objects.filter(
+            recipe=instance
+        ).values_list('user_id', flat=True),
+        (instance.pk,),
+        sign=-1
+    )
+
+
 class Favorite(models.Model):
     """Модель Избранных рецептов."""
+    counter_field = 'favorites_count'
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -161,6 +538,7 @@ class Favorite(models.Model):
         verbose_name = 'Рецепт в избранном'
         verbose_name_plural = 'Рецепты в избранном'
         ordering = ['user']
+        unique_together = ('user', 'recipe')
 
     def __str__(self):
         return self.recipe.name
@@ -174,22 +552,32 @@ class ShortLinkRecipe(models.Model):
     short_link_code = models.CharField(max_length=CHARFIELD_MAX_LENGTH,
                                        unique=True,
                                        verbose_name='Код ссылки')
+    clicks = models.PositiveBigIntegerField(default=0,
+                                            editable=False,
+                                            verbose_name='Переходы')
+
+    @staticmethod
+    def encode(recipe_id):
+        """Код ссылки — id Рецепта в системе счисления base62.
+
+        Коды уникальны без повторных попыток и не пересекаются с прежними
+        случайными кодами из десяти символов.
+        """
+        code = ''
+        while True:
+            recipe_id, digit = divmod(recipe_id, len(SHORTLINK_ALPHABET))
+            code = SHORTLINK_ALPHABET[digit] + code
+            if not recipe_id:
+                return code
 
     @receiver(models.signals.post_save, sender=Recipe)
     def generate_short_link_code(sender, instance, created, **kwargs):
         """Создание короткого кода для Рецептов при создании Рецепта."""
         if created:
-            while True:
-                try:
-                    ShortLinkRecipe.objects.create(
-                        short_link_code=shortuuid.ShortUUID().random(
-                            length=SHORTLINK_MAX_LENGTH
-                        ),
-                        recipe_id=instance.id
-                    )
-                    break
-                except IntegrityError:
-                    pass
+            ShortLinkRecipe.objects.create(
+                short_link_code=ShortLinkRecipe.encode(instance.id),
+                recipe_id=instance.id
+            )
 
     class Meta:
         verbose_name = 'Короткая ссылка на рецепт'
@@ -197,3 +585,242 @@ class ShortLinkRecipe(models.Model):
 
     def __str__(self):
         return self.recipe.name
+
+
+class FeedEntry(models.Model):
+    """Модель записи в ленте подписок Пользователя.
+
+    Записи создаются при публикации Рецепта для всех подписчиков автора
+    (fan-out on write). Рецепты авторов, у которых больше
+    FEED_FANOUT_MAX_SUBSCRIBERS подписчиков, в ленты не раскладываются
+    и подмешиваются при чтении. Режим автора хранится в feed_pull
+    и меняется при подписке и отписке; при возврате к раскладке ленты
+    подписчиков дополняются последними Рецептами автора.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        unique_together = ('user', 'recipe')
+
+    def __str__(self):
+        return self.recipe.name
+
+    @staticmethod
+    def get_feed(user, recipes):
+        """Рецепты ленты Пользователя из кверисета recipes от новых.
+
+        Лента читается диапазоном индекса (user, recipe) записей ленты
+        в порядке убывания id Рецепта. Рецепты авторов в режиме чтения
+        добавляются отдельной выборкой по автору, только если
+        Пользователь подписан на таких авторов.
+        """
+        pulled_ids = list(user.subscribers.filter(
+            subscribing__feed_pull=True
+        ).values_list('subscribing_id', flat=True))
+        if not pulled_ids:
+            return recipes.filter(feed_entries__user=user).order_by(
+                '-feed_entries__recipe_id'
+            )
+        return recipes.filter(id__in=FeedEntry.objects.filter(
+            user=user
+        ).order_by().values('recipe_id').union(Recipe.objects.filter(
+            author_id__in=pulled_ids
+        ).order_by().values('id'))).order_by('-id')
+
+    @staticmethod
+    def update_author_mode(author_id):
+        """Сверяет режим автора с числом подписчиков.
+
+        Возвращает True, если Рецепты автора читаются без fan-out.
+        При переходе к раскладке ленты подписчиков дополняются.
+        """
+        pull = Subscribe.objects.filter(
+            subscribing_id=author_id
+        )[:FEED_FANOUT_MAX_SUBSCRIBERS + 1].count() > (
+            FEED_FANOUT_MAX_SUBSCRIBERS
+        )
+        if User.objects.filter(pk=author_id).exclude(
+            feed_pull=pull
+        ).update(feed_pull=pull) and not pull:
+            FeedEntry.backfill(author_id)
+        return pull
+
+    @staticmethod
+    def backfill(author_id, user_ids=None):
+        """Добавляет в ленты подписчиков последние Рецепты автора."""
+        recipe_ids = list(Recipe.objects.filter(
+            author_id=author_id
+        ).order_by('-id').values_list('id', flat=True)[
+            :FEED_BACKFILL_RECIPES
+        ])
+        if user_ids is None:
+            user_ids = Subscribe.objects.filter(
+                subscribing_id=author_id
+            ).values_list('user_id', flat=True)
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(user_id=user_id, recipe_id=recipe_id)
+             for user_id in user_ids for recipe_id in recipe_ids],
+            ignore_conflicts=True
+        )
+
+
+@receiver(models.signals.post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    """Раскладывает новый Рецепт в ленты подписчиков автора."""
+    if not created or User.objects.filter(
+        pk=instance.author_id, feed_pull=True
+    ).exists():
+        return
+    subscriber_ids = Subscribe.objects.filter(
+        subscribing_id=instance.author_id
+    ).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(user_id=user_id, recipe=instance)
+         for user_id in subscriber_ids],
+        ignore_conflicts=True
+    )
+
+
+@receiver(models.signals.post_save, sender=Subscribe)
+def fill_feed_on_subscribe(sender, instance, created, **kwargs):
+    """Добавляет в ленту последние Рецепты автора при подписке."""
+    if not created or FeedEntry.update_author_mode(instance.subscribing_id):
+        return
+    FeedEntry.backfill(instance.subscribing_id, (instance.user_id,))
+
+
+@receiver(models.signals.post_delete, sender=Subscribe)
+def clear_feed_on_unsubscribe(sender, instance, **kwargs):
+    """Удаляет из ленты Рецепты автора при отписке."""
+    FeedEntry.objects.filter(
+        user_id=instance.user_id,
+        recipe__author_id=instance.subscribing_id
+    ).delete()
+    FeedEntry.update_author_mode(instance.subscribing_id)
+
+
+class StoredFile(models.Model):
+    """Модель счётчика ссылок на файл в хранилище медиафайлов.
+
+    Одинаковые загрузки сохраняются в один файл, который удаляется
+    с диска, только когда на него не остаётся ссылок.
+    """
+    name = models.CharField(
+        max_length=CHARFIELD_MAX_LENGTH,
+        unique=True,
+        verbose_name='Путь'
+    )
+    references = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число ссылок'
+    )
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return f'{self.name}: {self.references}'
+
+    @classmethod
+    def add_references(cls, names):
+        """Учитывает новые ссылки на уже сохранённые файлы."""
+        counts = Counter(names)
+        cls.objects.bulk_create(
+            [cls(name=name) for name in counts], ignore_conflicts=True
+        )
+        by_count = {}
+        for name, count in counts.items():
+            by_count.setdefault(count, []).append(name)
+        for count, names in by_count.items():
+            cls.objects.filter(name__in=names).update(
+                references=models.F('references') + count
+            )
+
+
+class ImageUpload(models.Model):
+    """Модель незавершённой или готовой загрузки изображения по частям.
+
+    Части дописываются во временный файл в UPLOAD_TEMP_DIR, а готовая
+    загрузка передаётся в поле изображения по токену вместо base64.
+    """
+    token = models.CharField(
+        max_length=UPLOAD_TOKEN_LENGTH,
+        unique=True,
+        verbose_name='Токен'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='image_uploads',
+        verbose_name='Пользователь'
+    )
+    size = models.PositiveIntegerField(verbose_name='Размер')
+    offset = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Загружено байт'
+    )
+    extension = models.CharField(
+        max_length=CHARFIELD_MAX_LENGTH,
+        blank=True,
+        verbose_name='Расширение'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания'
+    )
+
+    class Meta:
+        verbose_name = 'Загрузка изображения'
+        verbose_name_plural = 'Загрузки изображений'
+
+    def __str__(self):
+        return f'{self.token}: {self.offset}/{self.size}'
+
+    @property
+    def path(self):
+        """Путь к временному файлу загрузки."""
+        return os.path.join(settings.UPLOAD_TEMP_DIR, f'{self.token}.part')
+
+    @property
+    def completed(self):
+        return self.offset == self.size
+
+    @staticmethod
+    def get_extension(header):
+        """Расширение по сигнатуре изображения или None."""
+        for signature, extension in IMAGE_SIGNATURES:
+            if header.startswith(signature) and (
+                extension != 'webp' or header[8:12] == b'WEBP'
+            ):
+                return extension
+        return None
+
+    def discard(self):
+        """Удаляет загрузку вместе с временным файлом."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.delete()
+
+    @classmethod
+    def clear_expired(cls):
+        """Удаляет загрузки старше UPLOAD_EXPIRE_SECONDS."""
+        for upload in cls.objects.filter(
+            created_at__lt=timezone.now() - timedelta(
+                seconds=UPLOAD_EXPIRE_SECONDS
+            )
+        ):
+            upload.discard()
@@ -0,0 +1,109 @@
+"""Уменьшенные копии и WebP-варианты изображений Рецептов.
+
+Варианты из IMAGE_RENDITIONS создаются Pillow в пуле потоков после
+фиксации транзакции, в которой сохранено изображение, поэтому запрос
+на создание или редактирование Рецепта их не ждёт. Пути к готовым
+вариантам сохраняются в Recipe.image_renditions, только если
+изображение Рецепта за это время не изменилось. Дата изменения Рецепта
+при этом не обновляется: варианты меняют лишь ответы с renditions=1,
+которые валидируются версией вариантов.
+"""
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+from .constants import (IMAGE_RENDITION_QUALITY,
+                        IMAGE_RENDITION_WORKERS,
+                        IMAGE_RENDITIONS)
+from .models import CatalogVersion, Recipe
+
+# Отправляется после сохранения путей: запись идёт без post_save.
+renditions_created = Signal()
+
+logger = logging.getLogger(__name__)
+executor = ThreadPoolExecutor(
+    max_workers=IMAGE_RENDITION_WORKERS,
+    thread_name_prefix='renditions'
+)
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+
+def render(image, width, image_format):
+    """Вариант изображения шириной не больше width в формате image_format."""
+    image = image.copy()
+    if image.width > width:
+        image = image.resize(
+            (width, round(image.height * width / image.width)),
+            Image.Resampling.LANCZOS
+        )
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=IMAGE_RENDITION_QUALITY)
+    return buffer.getvalue()
+
+
+def get_rendition_name(image, rendition, image_format):
+    """Путь варианта в каталоге renditions каталога изображений."""
+    return posixpath.join(
+        image.field.upload_to, 'renditions',
+        f'{rendition}.{EXTENSIONS[image_format]}'
+    )
+
+
+def create_renditions(recipe):
+    """Создаёт варианты изображения Рецепта и сохраняет пути к ним."""
+    storage = recipe.image.storage
+    with recipe.image.open('rb') as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    renditions = {}
+    for rendition, width, image_format in IMAGE_RENDITIONS:
+        name = get_rendition_name(recipe.image, rendition, image_format)
+        renditions[rendition] = storage.save(
+            name, ContentFile(render(image, width, image_format))
+        )
+    with transaction.atomic():
+        current = Recipe.objects.select_for_update().filter(
+            pk=recipe.pk, image=recipe.image.name
+        ).values_list('image_renditions', flat=True).first()
+        if current is not None:
+            Recipe.objects.filter(
+                pk=recipe.pk, image=recipe.image.name
+            ).update(image_renditions=renditions)
+            CatalogVersion.bump(CatalogVersion.RENDITIONS)
+    if current is None:
+        outdated = renditions
+    else:
+        outdated = current
+        recipe.image_renditions = renditions
+        renditions_created.send(sender=Recipe, recipe_id=recipe.pk)
+    for name in outdated.values():
+        storage.delete(name)
+    return renditions
+
+
+def create_renditions_in_background(recipe_id):
+    """Задача пула: варианты изображения Рецепта по его id."""
+    try:
+        recipe = Recipe.objects.filter(pk=recipe_id).first()
+        if recipe is not None and recipe.image:
+            create_renditions(recipe)
+    except Exception:
+        logger.exception('Не удалось создать варианты изображения '
+                         'Рецепта %s.', recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_renditions(recipe_id):
+    """Ставит создание вариантов в пул после фиксации транзакции."""
+    transaction.on_commit(
+        lambda: executor.submit(create_renditions_in_background, recipe_id)
+    )
@@ -0,0 +1,385 @@
+"""Потоковый перенос Рецептов между окружениями в формате NDJSON.
+
+Каждая строка — один Рецепт с автором, Тэгами, Ингредиентами и именем
+файла изображения в хранилище. Связи передаются естественными ключами
+(email автора, slug Тэга, название и единица измерения Ингредиента),
+поэтому не зависят от id в исходной базе.
+
+Выгрузка читает Рецепты пачками по возрастанию id и продолжается
+с любого id. Загрузка записывает пачки в отдельных транзакциях
+массовыми INSERT; после сбоя её продолжают, пропустив уже записанные
+строки.
+"""
+import json
+import os
+import time
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.db import transaction
+from django.dispatch import Signal
+
+from .constants import (INTEGER_FIELD_MAX_VALUE,
+                        INTEGER_FIELD_MIN_VALUE,
+                        TRANSFER_BATCH_SIZE)
+from .models import (CatalogVersion,
+                     FeedEntry,
+                     ImageUpload,
+                     Ingredient,
+                     Recipe,
+                     RecipeIngredient,
+                     ShortLinkRecipe,
+                     StoredFile,
+                     Tag,
+                     update_counter)
+from .renditions import schedule_renditions
+from users.models import Subscribe
+
+User = get_user_model()
+
+# Отправляется после записи пачки: массовые INSERT не вызывают post_save.
+recipes_imported = Signal()
+
+
+def export_recipes(after=0, batch_size=TRANSFER_BATCH_SIZE):
+    """Строки NDJSON с Рецептами, id которых больше after."""
+    while True:
+        recipes = list(
+            Recipe.objects.filter(id__gt=after).select_related(
+                'author'
+            ).prefetch_related(
+                'tags', 'recipe_ingredient__ingredient'
+            ).order_by('id')[:batch_size]
+        )
+        for recipe in recipes:
+            yield json.dumps({
+                'id': recipe.id,
+                'author': recipe.author.email,
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'image': recipe.image.name,
+                'tags': [tag.slug for tag in recipe.tags.all()],
+                'ingredients': [
+                    {
+                        'name': row.ingredient.name,
+                        'measurement_unit': row.ingredient.measurement_unit,
+                        'amount': row.amount,
+                    }
+                    for row in recipe.recipe_ingredient.all()
+                ],
+            }, ensure_ascii=False) + '\n'
+        if len(recipes) < batch_size:
+            return
+        after = recipes[-1].id
+
+
+def get_amount(value):
+    """Целое число в допустимых для модели пределах."""
+    if not isinstance(value, int) or isinstance(value, bool) or not (
+        INTEGER_FIELD_MIN_VALUE <= value <= INTEGER_FIELD_MAX_VALUE
+    ):
+        raise ValueError(
+            f'Ожидается целое число от {INTEGER_FIELD_MIN_VALUE} '
+            f'до {INTEGER_FIELD_MAX_VALUE}.'
+        )
+    return value
+
+
+def parse_record(line):
+    """Проверенный словарь Рецепта из строки NDJSON."""
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as error:
+        raise ValueError(f'Некорректный JSON: {error.msg}.')
+    if not isinstance(record, dict):
+        raise ValueError('Строка должна содержать объект.')
+    for field in ('name', 'text', 'image'):
+        if not isinstance(record.get(field), str) or not record[field]:
+            raise ValueError(f'Не заполнено поле {field}.')
+    if len(record['name']) > Recipe._meta.get_field('name').max_length:
+        raise ValueError('Слишком длинное название.')
+    record['cooking_time'] = get_amount(record.get('cooking_time'))
+    tags = record.get('tags')
+    if not isinstance(tags, list) or not tags:
+        raise ValueError('Нельзя создать рецепт без тэгов.')
+    if len(set(map(str, tags))) != len(tags):
+        raise ValueError('Такой тэг уже присвоен рецепту.')
+    ingredients = record.get('ingredients')
+    if not isinstance(ingredients, list) or not ingredients:
+        raise ValueError('Нельзя создать рецепт без ингредиентов.')
+    amounts = {}
+    for ingredient in ingredients:
+        if not isinstance(ingredient, dict):
+            raise ValueError('Ингредиент должен быть объектом.')
+        key = (str(ingredient.get('name', '')).strip(),
+               str(ingredient.get('measurement_unit', '')).strip())
+        if not all(key):
+            raise ValueError('Не указан ингредиент или единица измерения.')
+        if key in amounts:
+            raise ValueError('Такой ингредиент уже есть в рецепте.')
+        amounts[key] = get_amount(ingredient.get('amount'))
+    record['ingredients'] = amounts
+    return record
+
+
+class RecipeImporter:
+    """Загрузка Рецептов из строк NDJSON пачками.
+
+    lines — число обработанных строк, записанные пачки зафиксированы,
+    поэтому после сбоя загрузку продолжают с skip=lines. Строки
+    с ошибками пропускаются и попадают в errors.
+
+    create_ingredients разрешает дополнять справочник Ингредиентов.
+    Без trusted_images поле image принимает только учтённые в StoredFile
+    изображения Рецептов или токен завершённой загрузки автора: новая
+    ссылка на неучтённый файл позволила бы удалить чужое изображение
+    вместе с загруженным Рецептом.
+    """
+
+    def __init__(self, author=None, batch_size=TRANSFER_BATCH_SIZE,
+                 storage=None, create_ingredients=True, trusted_images=True):
+        self.author = author
+        self.batch_size = batch_size
+        self.create_ingredients = create_ingredients
+        self.trusted_images = trusted_images
+        self.uploaded = Counter()
+        self.storage = storage or Recipe._meta.get_field('image').storage
+        self.lines = 0
+        self.imported = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    @property
+    def rate(self):
+        """Записанных Рецептов в секунду."""
+        return self.imported / max(time.perf_counter() - self.started, 1e-9)
+
+    def get_report(self):
+        return {
+            'lines': self.lines,
+            'imported': self.imported,
+            'errors': self.errors,
+            'seconds': round(time.perf_counter() - self.started, 3),
+            'recipes_per_second': round(self.rate, 1),
+        }
+
+    def run(self, lines, skip=0):
+        """Загружает строки после первых skip, отдавая себя после пачек."""
+        self.lines = skip
+        lines = islice(lines, skip, None)
+        while batch := list(islice(lines, self.batch_size)):
+            errors_count = len(self.errors)
+            records = []
+            for number, line in enumerate(batch, self.lines + 1):
+                if not line.strip():
+                    continue
+                try:
+                    records.append((number, parse_record(line)))
+                except ValueError as error:
+                    self.add_error(number, error)
+            try:
+                with transaction.atomic():
+                    recipe_ids = self.import_batch(records)
+            except Exception:
+                del self.errors[errors_count:]
+                raise
+            self.errors[errors_count:] = sorted(
+                self.errors[errors_count:], key=lambda error: error['line']
+            )
+            self.lines += len(batch)
+            self.imported += len(recipe_ids)
+            if recipe_ids:
+                recipes_imported.send(sender=Recipe, recipe_ids=recipe_ids)
+            yield self
+
+    def add_error(self, number, error):
+        self.errors.append({'line': number, 'error': str(error)})
+
+    def get_authors(self, records):
+        """Авторы по email, если автор не задан для всей загрузки."""
+        if self.author is not None:
+            return {}
+        return {
+            user.email: user for user in User.objects.filter(
+                email__in={record.get('author') for _, record in records}
+            )
+        }
+
+    def get_ingredients(self, records):
+        """Ингредиенты справочника по ключу (название, единица)."""
+        keys = {key for _, record in records for key in record['ingredients']}
+        return {
+            (ingredient.name, ingredient.measurement_unit): ingredient
+            for ingredient in Ingredient.objects.filter(
+                name__in={name for name, _ in keys}
+            )
+            if (ingredient.name, ingredient.measurement_unit) in keys
+        }
+
+    def add_ingredients(self, keys):
+        """Добавляет Ингредиенты в справочник и возвращает их по ключу."""
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit)
+             for name, unit in keys],
+            ignore_conflicts=True
+        )
+        CatalogVersion.bump(CatalogVersion.INGREDIENTS)
+        return {
+            (ingredient.name, ingredient.measurement_unit): ingredient
+            for ingredient in Ingredient.objects.filter(
+                name__in={name for name, _ in keys}
+            )
+        }
+
+    def get_images(self, records):
+        """Имена файлов в хранилище по значению поля image.
+
+        Файлы из завершённых загрузок сохраняются в хранилище, которое
+        само учитывает ссылку на них; их имена попадают в uploaded.
+        """
+        values = {record['image'] for _, record in records}
+        if self.trusted_images:
+            return {value: value for value in values}
+        upload_to = Recipe._meta.get_field('image').upload_to
+        images = {
+            name: name for name in StoredFile.objects.filter(
+                name__in=[value for value in values
+                          if value.startswith(upload_to)],
+                references__gt=0
+            ).values_list('name', flat=True)
+        }
+        for upload in ImageUpload.objects.filter(
+            token__in=values - images.keys(), user=self.author
+        ):
+            if not upload.completed or not os.path.exists(upload.path):
+                continue
+            with open(upload.path, 'rb') as file:
+                name = self.storage.save(
+                    f'{upload_to}upload.{upload.extension}', File(file)
+                )
+            images[upload.token] = name
+            self.uploaded[name] += 1
+            transaction.on_commit(upload.discard)
+        return images
+
+    def check_image(self, name):
+        """Текст ошибки для имени файла изображения или None."""
+        if name is None:
+            return ('Изображение не найдено.' if self.trusted_images
+                    else 'Изображение не найдено: укажите изображение '
+                         'рецепта или токен загрузки.')
+        try:
+            exists = self.storage.exists(name)
+        except SuspiciousFileOperation:
+            return 'Недопустимый путь к изображению.'
+        return None if exists else 'Изображение не найдено.'
+
+    def import_batch(self, records):
+        """Записывает пачку массовыми INSERT и возвращает id Рецептов."""
+        authors = self.get_authors(records)
+        tags = {tag.slug: tag.id for tag in Tag.objects.filter(
+            slug__in={str(slug) for _, record in records
+                      for slug in record['tags']}
+        )}
+        ingredients = self.get_ingredients(records)
+        checked = []
+        for number, record in records:
+            author = self.author or authors.get(record.get('author'))
+            unknown_tags = set(map(str, record['tags'])) - tags.keys()
+            unknown_ingredients = record['ingredients'].keys() - ingredients
+            if author is None:
+                self.add_error(number, 'Автор не найден.')
+            elif unknown_tags:
+                self.add_error(
+                    number, f'Тэги не найдены: {", ".join(unknown_tags)}.'
+                )
+            elif unknown_ingredients and not self.create_ingredients:
+                self.add_error(number, 'Ингредиенты не найдены: {}.'.format(
+                    ', '.join(f'{name} ({unit})'
+                              for name, unit in unknown_ingredients)
+                ))
+            else:
+                checked.append((number, record, author))
+        self.uploaded = Counter()
+        images = self.get_images(
+            [(number, record) for number, record, _ in checked]
+        )
+        valid = []
+        for number, record, author in checked:
+            record['image'] = images.get(record['image'])
+            error = self.check_image(record['image'])
+            if error:
+                self.add_error(number, error)
+            else:
+                valid.append((record, author))
+        if not valid:
+            return []
+        missing = {
+            key for record, _ in valid for key in record['ingredients']
+        } - ingredients.keys()
+        if missing:
+            ingredients |= self.add_ingredients(missing)
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name=record['name'],
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=record['image'],
+            )
+            for record, author in valid
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient=ingredients[key], amount=amount
+            )
+            for recipe, (record, _) in zip(recipes, valid)
+            for key, amount in record['ingredients'].items()
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag_id=tags[str(slug)])
+            for recipe, (record, _) in zip(recipes, valid)
+            for slug in record['tags']
+        )
+        ShortLinkRecipe.objects.bulk_create(
+            ShortLinkRecipe(
+                short_link_code=ShortLinkRecipe.encode(recipe.id),
+                recipe=recipe
+            )
+            for recipe in recipes
+        )
+        StoredFile.add_references((
+            Counter(recipe.image.name for recipe in recipes) - self.uploaded
+        ).elements())
+        self.update_authors(recipes)
+        CatalogVersion.bump(CatalogVersion.RECIPES)
+        for recipe in recipes:
+            schedule_renditions(recipe.id)
+        return [recipe.id for recipe in recipes]
+
+    def update_authors(self, recipes):
+        """Счётчики Рецептов авторов и ленты их подписчиков."""
+        by_author = {}
+        for recipe in recipes:
+            by_author.setdefault(recipe.author_id, []).append(recipe)
+        by_count = {}
+        for author_id, author_recipes in by_author.items():
+            by_count.setdefault(len(author_recipes), []).append(author_id)
+        for count, author_ids in by_count.items():
+            update_counter(User, author_ids, 'recipes_count', count)
+        push_author_ids = User.objects.filter(
+            id__in=by_author, feed_pull=False
+        ).values_list('id', flat=True)
+        subscriptions = Subscribe.objects.filter(
+            subscribing_id__in=push_author_ids
+        ).values_list('subscribing_id', 'user_id')
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(user_id=user_id, recipe=recipe)
+             for author_id, user_id in subscriptions
+             for recipe in by_author[author_id]],
+            ignore_conflicts=True
+        )
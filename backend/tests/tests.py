@@ -1,6 +1,87 @@
+import hashlib
+import importlib
+import json
+import os
+import tempfile
+from datetime import timedelta
 from http import HTTPStatus
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-from django.test import Client, TestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, router
+from django.http import HttpResponse
+from django.test import (AsyncRequestFactory,
+                         Client,
+                         RequestFactory,
+                         TestCase,
+                         override_settings)
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api import views as api_views
+from api.async_views import get_async_urls
+from api.cache import (LIST_VERSION_KEY,
+                       aget_detail_key,
+                       aget_list_key,
+                       get_detail_key,
+                       get_list_key,
+                       get_version)
+from api.constants import CLICK_BUFFER_MAX_SIZE, SHORT_LINK_CACHE_SIZE
+from api.db_router import (REPLICA_PIN_COOKIE,
+                           ReplicaRoutingMiddleware,
+                           read_from_primary)
+from api.ingredient_index import get_deletes, ingredient_index
+from api.shopping_list import get_shopping_list
+from api.storage import ContentAddressedStorage
+from api.short_links import ClickBuffer, ShortLinkCache
+from api.urls import router as api_router
+from recipes.constants import UPLOAD_MAX_OPEN_PER_USER
+from recipes.models import (CatalogVersion,
+                            Favorite,
+                            FeedEntry,
+                            ImageUpload,
+                            Ingredient,
+                            Recipe,
+                            RecipeIngredient,
+                            ShoppingCart,
+                            ShoppingCartIngredient,
+                            ShortLinkRecipe,
+                            StoredFile,
+                            Tag,
+                            update_counter)
+from recipes.renditions import (create_renditions,
+                                create_renditions_in_background,
+                                schedule_renditions)
+from recipes.transfer import RecipeImporter
+from users.models import Subscribe
+
+User = get_user_model()
+
+
+def create_recipe(author, name='Рецепт', text='Описание'):
+    """Создание Рецепта с одним тэгом и одним ингредиентом."""
+    recipe = Recipe.objects.create(
+        author=author,
+        name=name,
+        text=text,
+        image='recipes/images/test.png',
+        cooking_time=10,
+    )
+    recipe.tags.set(Tag.objects.all()[:1])
+    RecipeIngredient.objects.create(
+        recipe=recipe,
+        ingredient=Ingredient.objects.first(),
+        amount=100,
+    )
+    update_counter(User, (author.id,), 'recipes_count', 1)
+    return recipe
 
 
 class FoodgramAPITestCase(TestCase):
@@ -18,3 +99,1464 @@ class FoodgramAPITestCase(TestCase):
         """Проверка доступности списка пользователей."""
         response = self.guest_client.get('/api/users/')
         self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class RecipeListQueriesTestCase(TestCase):
+    """Тесты числа запросов к списку рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Рецептов', password='pass'
+        )
+        cls.reader = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Читатель', last_name='Рецептов', password='pass'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def get_query_count(self):
+        """Число запросов к БД при запросе страницы списка рецептов.
+
+        Два запроса вычисляют валидаторы ETag, пять — формируют страницу.
+        """
+        with self.assertNumQueries(7) as context:
+            response = self.client.get('/api/recipes/?limit=50')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        """Число запросов не растёт вместе с размером страницы."""
+        create_recipe(self.author, name='Первый')
+        single_page = self.get_query_count()
+        for index in range(10):
+            create_recipe(self.author, name=f'Рецепт {index}')
+        self.assertEqual(self.get_query_count(), single_page)
+
+    def test_user_flags_are_annotated(self):
+        """Флаги избранного, корзины и подписки берутся из аннотаций."""
+        recipe = create_recipe(self.author)
+        recipe.favorite.create(user=self.reader)
+        self.reader.subscribers.create(subscribing=self.author)
+        result = self.client.get('/api/recipes/').json()['results'][0]
+        self.assertTrue(result['is_favorited'])
+        self.assertFalse(result['is_in_shopping_cart'])
+        self.assertTrue(result['author']['is_subscribed'])
+
+
+class CursorPaginationTestCase(TestCase):
+    """Тесты курсорной пагинации."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Рецептов', password='pass'
+        )
+        cls.recipes = [create_recipe(cls.author, name=f'Рецепт {index}')
+                       for index in range(5)]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages_cover_all_recipes(self):
+        """Курсорные страницы отдают все рецепты от новых к старым."""
+        client = APIClient()
+        url = '/api/recipes/?cursor=&limit=2'
+        ids = []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(
+            ids, sorted((recipe.id for recipe in self.recipes), reverse=True)
+        )
+
+    def test_page_number_mode_is_default(self):
+        """Без параметра cursor используется постраничная пагинация."""
+        response = APIClient().get('/api/recipes/?page=2&limit=2')
+        self.assertEqual(response.data['count'], len(self.recipes))
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class SubscriptionFeedTestCase(TestCase):
+    """Тесты ленты подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Рецептов', password='pass'
+        )
+        cls.reader = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Читатель', last_name='Рецептов', password='pass'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def get_feed_ids(self):
+        """Идентификаторы Рецептов в ленте Пользователя."""
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_feed_follows_subscriptions(self):
+        """Лента заполняется при подписке и публикации и очищается."""
+        old_recipe = create_recipe(self.author, name='Старый')
+        self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        new_recipe = create_recipe(self.author, name='Новый')
+        self.assertEqual(self.get_feed_ids(), [new_recipe.id, old_recipe.id])
+
+        self.client.delete(f'/api/users/{self.author.id}/subscribe/')
+        self.assertEqual(self.get_feed_ids(), [])
+
+    @mock.patch('recipes.models.FEED_FANOUT_MAX_SUBSCRIBERS', 0)
+    def test_feed_pulls_popular_authors(self):
+        """Рецепты популярных авторов читаются без записей в ленте."""
+        self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        recipe = create_recipe(self.author)
+        self.assertFalse(self.reader.feed_entries.exists())
+        self.assertEqual(self.get_feed_ids(), [recipe.id])
+
+    @mock.patch('recipes.models.FEED_FANOUT_MAX_SUBSCRIBERS', 1)
+    def test_feed_is_backfilled_when_author_returns_to_fan_out(self):
+        """Рецепты периода чтения попадают в ленты после отписок."""
+        other = User.objects.create_user(
+            email='other@foodgram.ru', username='other',
+            first_name='Другой', last_name='Читатель', password='pass'
+        )
+        Subscribe.objects.create(user=other, subscribing=self.author)
+        self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.author.refresh_from_db()
+        self.assertTrue(self.author.feed_pull)
+        recipe = create_recipe(self.author)
+        self.assertFalse(self.reader.feed_entries.exists())
+        Subscribe.objects.filter(user=other).delete()
+        self.author.refresh_from_db()
+        self.assertFalse(self.author.feed_pull)
+        self.assertEqual(
+            list(self.reader.feed_entries.values_list('recipe', flat=True)),
+            [recipe.id]
+        )
+        self.assertEqual(self.get_feed_ids(), [recipe.id])
+
+    def test_migration_backfills_existing_subscriptions(self):
+        """Миграция заполняет ленты по подпискам, существовавшим до неё."""
+        recipe = create_recipe(self.author)
+        Subscribe.objects.create(user=self.reader, subscribing=self.author)
+        FeedEntry.objects.all().delete()
+        importlib.import_module(
+            'recipes.migrations.0013_backfill_feed'
+        ).backfill_feed(apps, None)
+        self.assertEqual(self.get_feed_ids(), [recipe.id])
+
+
+class AnonymousRecipeCacheTestCase(TestCase):
+    """Тесты кэша ответов для анонимных Пользователей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Рецептов', password='pass'
+        )
+        cls.recipe = create_recipe(cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = APIClient()
+
+    def test_list_is_cached_and_invalidated(self):
+        """Список кэшируется и обновляется при создании Рецепта."""
+        self.guest_client.get('/api/recipes/?limit=2&page=1')
+        with self.assertNumQueries(0):
+            response = self.guest_client.get('/api/recipes/?page=1&limit=2')
+        self.assertEqual(response.data['count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.author, name='Новый')
+        response = self.guest_client.get('/api/recipes/?page=1&limit=2')
+        self.assertEqual(response.data['count'], 2)
+
+    def test_cache_is_invalidated_after_commit(self):
+        """Версия кэша не меняется до фиксации транзакции записи."""
+        version = get_version(LIST_VERSION_KEY)
+        with self.captureOnCommitCallbacks() as callbacks:
+            create_recipe(self.author, name='Новый')
+            self.assertEqual(get_version(LIST_VERSION_KEY), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_version(LIST_VERSION_KEY), version)
+
+    def test_detail_is_invalidated_by_tags_change(self):
+        """Рецепт обновляется в кэше при изменении его Тэгов."""
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.guest_client.get(url)
+        with self.assertNumQueries(0):
+            self.guest_client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.tags.set(Tag.objects.all())
+        response = self.guest_client.get(url)
+        self.assertEqual(len(response.data['tags']), Tag.objects.count())
+
+
+class ConditionalGetTestCase(TestCase):
+    """Тесты условных GET-запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Рецептов', password='pass'
+        )
+        cls.recipe = create_recipe(cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_tags_not_modified_until_catalog_changes(self):
+        """Список Тэгов не пересылается, пока справочник не изменится."""
+        etag = self.client.get('/api/tags/')['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Tag.objects.create(name='Перекус', slug='snack')
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_recipe_not_modified_since_last_update(self):
+        """Рецепт не пересылается, если не изменялся с Last-Modified."""
+        url = f'/api/recipes/{self.recipe.id}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_recipe_list_etag_follows_user_state(self):
+        """ETag списка меняется при добавлении Рецепта в избранное."""
+        self.client.force_authenticate(self.author)
+        etag = self.client.get('/api/recipes/')['ETag']
+        response = self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.recipe.favorite.create(user=self.author)
+        response = self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.data['results'][0]['is_favorited'])
+
+    def test_recipe_validators_follow_author_profile(self):
+        """Изменение профиля автора обновляет валидаторы Рецептов."""
+        url = f'/api/recipes/{self.recipe.id}/'
+        CatalogVersion.get(CatalogVersion.AUTHORS)
+        etag = self.client.get('/api/recipes/')['ETag']
+        last_modified = self.client.get(url)['Last-Modified']
+        self.author.first_name = 'Переименованный'
+        with mock.patch('recipes.models.timezone.now',
+                        return_value=timezone.now() + timedelta(minutes=1)), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.author.save()
+        response = self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.data['author']['first_name'],
+                         'Переименованный')
+
+
+class RecipeSearchTestCase(TestCase):
+    """Тесты поиска Рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Рецептов', password='pass'
+        )
+        cls.borscht = create_recipe(
+            cls.author, name='Украинский борщ', text='Суп со свёклой.'
+        )
+        cls.salad = create_recipe(
+            cls.author, name='Винегрет', text='Салат, похожий на борщ.'
+        )
+        create_recipe(cls.author, name='Сырники', text='Творог и мука.')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        """Идентификаторы найденных Рецептов в порядке выдачи."""
+        response = APIClient().get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_search_by_name_and_text(self):
+        """Поиск находит Рецепты по словам в названии и описании."""
+        self.assertEqual(
+            set(self.search('борщ')), {self.borscht.id, self.salad.id}
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'Требуется PostgreSQL')
+    def test_search_is_ranked_and_stemmed(self):
+        """Совпадение в названии выше, словоформы и опечатки находятся."""
+        self.assertEqual(
+            self.search('борщи'), [self.borscht.id, self.salad.id]
+        )
+        self.assertEqual(self.search('Сырнки'), [
+            recipe.id for recipe in Recipe.objects.filter(name='Сырники')
+        ])
+
+
+class IngredientIndexTestCase(TestCase):
+    """Тесты индекса Ингредиентов в памяти процесса."""
+
+    def setUp(self):
+        self.client = APIClient()
+        ingredient_index.invalidate()
+        ingredient_index.warm_up()
+
+    def test_rebuild_publishes_new_snapshot(self):
+        """Перестроение не меняет снимок, который читает поиск."""
+        snapshot = ingredient_index.snapshot
+        keys = snapshot.keys
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='соль тестовая',
+                                      measurement_unit='г')
+        self.assertIsNot(ingredient_index.refresh(), snapshot)
+        self.assertIs(snapshot.keys, keys)
+        self.assertNotIn('соль тестовая', snapshot.keys)
+
+    def test_prefix_search_without_queries(self):
+        """Поиск по префиксу не обращается к БД и ранжирует результат."""
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/ingredients/', {'name': 'Соль'})
+        names = [item['name'] for item in response.json()]
+        self.assertEqual(names[0], 'соль')
+        self.assertTrue(all(name.startswith('соль') for name in names))
+        self.assertEqual(names[1:], sorted(names[1:], key=len))
+
+    def test_index_is_rebuilt_on_change(self):
+        """Новый Ингредиент сразу попадает в индекс."""
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='соль тестовая',
+                                      measurement_unit='г')
+        response = self.client.get('/api/ingredients/', {'name': 'соль т'})
+        self.assertEqual([item['name'] for item in response.json()],
+                         ['соль тестовая'])
+
+    def test_fuzzy_search_tolerates_typos(self):
+        """Нечёткий поиск находит Ингредиенты с опечатками в запросе."""
+        for query, expected in (('абрикосы', 'абрикосы'),
+                                ('памидор', 'помидоры'),
+                                ('малако', 'молоко')):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    '/api/ingredients/', {'name': query, 'fuzzy': '1'}
+                )
+                self.assertEqual(response.json()[0]['name'], expected)
+
+    def test_fuzzy_search_bounds_long_queries(self):
+        """Длинные слова запроса не разворачиваются в варианты удалений."""
+        with mock.patch('api.ingredient_index.get_deletes',
+                        wraps=get_deletes) as deletes:
+            response = self.client.get(
+                '/api/ingredients/',
+                {'name': 'молоко ' + 'ы' * 1000, 'fuzzy': '1'}
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()[0]['name'], 'молоко')
+        self.assertEqual([call.args[0] for call in deletes.call_args_list],
+                         ['молоко'])
+
+
+class LoadCatalogTestCase(TestCase):
+    """Тесты команды загрузки справочников."""
+
+    def load(self, content, suffix):
+        """Загрузка справочника из временного файла."""
+        with tempfile.NamedTemporaryFile(
+            'w', suffix=suffix, encoding='utf-8'
+        ) as file:
+            file.write(content)
+            file.flush()
+            call_command('load_catalog', file.name, stdout=StringIO())
+
+    def test_load_is_deduplicated_and_idempotent(self):
+        """Дубликаты пропускаются, повторная загрузка ничего не меняет."""
+        count = Ingredient.objects.count()
+        version = CatalogVersion.get(CatalogVersion.INGREDIENTS).version
+        content = ('name,measurement_unit\n'
+                   'соль,г\n'
+                   'соль пищевая тестовая,г\n'
+                   'соль пищевая тестовая,г\n')
+        self.load(content, '.csv')
+        self.load(content, '.csv')
+        self.assertEqual(Ingredient.objects.count(), count + 1)
+        self.assertEqual(
+            CatalogVersion.get(CatalogVersion.INGREDIENTS).version,
+            version + 1
+        )
+
+    def test_load_json_array(self):
+        """Загрузка массива JSON."""
+        self.load('[{"name": "Перекус", "slug": "snack"}]', '_tags.json')
+        self.assertTrue(Tag.objects.filter(slug='snack').exists())
+
+    def test_load_updates_tag_slug(self):
+        """Слаг существующего Тэга обновляется, повтор ничего не меняет."""
+        self.load('[{"name": "Перекус", "slug": "snack"}]', '_tags.json')
+        version = CatalogVersion.get(CatalogVersion.TAGS).version
+        content = ('[{"name": "Перекус", "slug": "snacks"}, '
+                   '{"name": "Перекус", "slug": "bite"}]')
+        self.load(content, '_tags.json')
+        self.load(content, '_tags.json')
+        self.assertEqual(Tag.objects.get(name='Перекус').slug, 'snacks')
+        self.assertEqual(
+            CatalogVersion.get(CatalogVersion.TAGS).version, version + 1
+        )
+
+    def test_slug_conflicts_are_skipped(self):
+        """Строка со слагом другого Тэга пропускается, остальные пишутся."""
+        self.load('[{"name": "Перекус", "slug": "snack"}]', '_tags.json')
+        stderr = StringIO()
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='_tags.json', encoding='utf-8'
+        ) as file:
+            file.write('[{"name": "Полдник", "slug": "snack"}, '
+                       '{"name": "Ужин поздний", "slug": "late"}]')
+            file.flush()
+            call_command('load_catalog', file.name, stdout=StringIO(),
+                         stderr=stderr)
+        self.assertIn('snack', stderr.getvalue())
+        self.assertFalse(Tag.objects.filter(name='Полдник').exists())
+        self.assertTrue(Tag.objects.filter(slug='late').exists())
+
+    def test_load_invalidates_recipe_cache(self):
+        """Загрузка справочника сбрасывает кэш ответов о Рецептах."""
+        version = get_version(LIST_VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.load('[{"name": "Перекус", "slug": "snack"}]', '_tags.json')
+        self.assertNotEqual(get_version(LIST_VERSION_KEY), version)
+
+
+class ShoppingListDownloadTestCase(TestCase):
+    """Тесты выгрузки Списка покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='cook@foodgram.ru', username='cook',
+            first_name='Повар', last_name='Поваров', password='pass'
+        )
+        cls.recipe_ids = []
+        for name in ('Первый', 'Второй'):
+            recipe = create_recipe(cls.user, name)
+            recipe.shopping_cart.create(user=cls.user)
+            cls.recipe_ids.append(recipe.id)
+        ShoppingCartIngredient.rebuild()
+        call_command('reconcile_counters', stdout=StringIO())
+        cls.ingredient = Ingredient.objects.first()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, file_format, **headers):
+        return self.client.get(
+            '/api/recipes/download_shopping_cart/',
+            {'format': file_format}, **headers
+        )
+
+    def test_formats(self):
+        """Ингредиенты суммируются во всех форматах."""
+        self.assertEqual(
+            self.download('txt').getvalue().decode(),
+            f'{self.ingredient.name}: 200 '
+            f'{self.ingredient.measurement_unit}\n'
+        )
+        self.assertIn(
+            f'{self.ingredient.name},200,',
+            self.download('csv').getvalue().decode()
+        )
+        self.assertEqual(json.loads(self.download('json').getvalue()), [{
+            'name': self.ingredient.name,
+            'amount': 200,
+            'measurement_unit': self.ingredient.measurement_unit,
+        }])
+        self.assertEqual(
+            self.download('pdf').status_code, HTTPStatus.BAD_REQUEST
+        )
+
+    def test_not_modified_until_cart_changes(self):
+        """Список покупок не пересылается, пока корзина не изменится."""
+        etag = self.download('csv')['ETag']
+        response = self.download('csv', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        ShoppingCart.objects.filter(user=self.user).first().delete()
+        response = self.download('csv', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_units_are_normalized(self):
+        """Килограммы и граммы одного ингредиента складываются."""
+        recipe = create_recipe(self.user, 'Третий')
+        recipe.shopping_cart.create(user=self.user)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=Ingredient.objects.create(
+                    name='мука тестовая', measurement_unit=unit
+                ),
+                amount=amount
+            ) for unit, amount in (('кг', 2), ('г', 300))
+        )
+        ShoppingCartIngredient.rebuild()
+        rows = list(get_shopping_list(self.user))
+        self.assertIn(
+            {'name': 'мука тестовая', 'measurement_unit': 'г',
+             'amount': 2300},
+            rows
+        )
+
+    def test_large_cart_is_aggregated_in_one_query(self):
+        """Корзина из тысяч строк агрегируется одним запросом."""
+        ingredients = Ingredient.objects.all()[:100]
+        for number in range(20):
+            recipe = create_recipe(self.user, f'Большой {number}')
+            recipe.shopping_cart.create(user=self.user)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=1)
+                for ingredient in ingredients[1:]
+            )
+        ShoppingCartIngredient.rebuild()
+        with self.assertNumQueries(1):
+            rows = list(get_shopping_list(self.user))
+        self.assertEqual(len(rows), len(ingredients))
+        self.assertEqual(
+            sum(row['amount'] for row in rows), 200 + 20 * (100 + 99)
+        )
+
+    def test_cart_totals_follow_cart_and_recipe_changes(self):
+        """Суммы в корзине обновляются при изменении корзины и Рецепта."""
+        recipe = create_recipe(self.user, 'Третий')
+        url = f'/api/recipes/{recipe.id}/'
+        self.client.post(f'{url}shopping_cart/')
+        self.client.patch(url, {
+            'ingredients': [{'id': self.ingredient.id, 'amount': 5}],
+            'tags': [Tag.objects.first().id],
+            'name': 'Третий', 'text': 'Описание', 'cooking_time': 10,
+        }, format='json')
+        self.assertEqual(self.user.cart_ingredients.get(
+            ingredient=self.ingredient
+        ).total_amount, 205)
+        self.client.delete(f'/api/recipes/{self.recipe_ids[0]}/')
+        self.client.delete(f'{url}shopping_cart/')
+        self.assertEqual(self.user.cart_ingredients.get(
+            ingredient=self.ingredient
+        ).total_amount, 100)
+        output = StringIO()
+        call_command('rebuild_shopping_carts', '--check', stdout=output)
+        self.assertIn('Расхождений: 0', output.getvalue())
+
+    def post_admin_change(self, recipe, amount):
+        """Изменение количества Ингредиента Рецепта через админку."""
+        admin_user = User.objects.create_superuser(
+            email='admin@foodgram.ru', username='admin',
+            first_name='Админ', last_name='Админов', password='pass'
+        )
+        client = APIClient()
+        client.force_login(admin_user)
+        url = f'/admin/recipes/recipe/{recipe.id}/change/'
+        context = client.get(url).context
+        forms = [context['adminform'].form]
+        data = {}
+        for inline in context['inline_admin_formsets']:
+            formset = inline.formset
+            management_form = formset.management_form
+            data.update({
+                management_form.add_prefix(name): value
+                for name, value in management_form.initial.items()
+            })
+            forms.extend(formset.forms)
+        for form in forms:
+            for name in form.fields:
+                value = form[name].value()
+                if value is not None and not hasattr(value, 'url'):
+                    data[form.add_prefix(name)] = value
+        data['recipe_ingredient-0-amount'] = amount
+        self.assertEqual(client.post(url, data).status_code, HTTPStatus.FOUND)
+
+    def test_cart_totals_follow_admin_and_cascade(self):
+        """Суммы в корзине учитывают правку в админке и удаление автора."""
+        author = User.objects.create_user(
+            email='other@foodgram.ru', username='other',
+            first_name='Другой', last_name='Автор', password='pass'
+        )
+        recipe = create_recipe(author, 'Чужой')
+        self.client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        self.post_admin_change(recipe, 150)
+        self.assertEqual(self.user.cart_ingredients.get(
+            ingredient=self.ingredient
+        ).total_amount, 350)
+        author.delete()
+        self.assertEqual(self.user.cart_ingredients.get(
+            ingredient=self.ingredient
+        ).total_amount, 200)
+        output = StringIO()
+        call_command('rebuild_shopping_carts', '--check', stdout=output)
+        self.assertIn('Расхождений: 0', output.getvalue())
+
+    def test_cart_totals_do_not_go_below_zero(self):
+        """Разошедшаяся сумма не становится отрицательной."""
+        ShoppingCartIngredient.apply(
+            (self.user.id,), {self.ingredient.id: -500}
+        )
+        self.assertFalse(self.user.cart_ingredients.exists())
+
+
+class BatchRecipesTestCase(TestCase):
+    """Тесты пакетного добавления Рецептов в Избранное и корзину."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='planner@foodgram.ru', username='planner',
+            first_name='Плановик', last_name='Недельный', password='pass'
+        )
+        cls.recipe_ids = [
+            create_recipe(cls.user, f'Рецепт {number}').id
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_batch_favorite(self):
+        """Статусы возвращаются для каждого id, повторы не создаются."""
+        first, second, third = self.recipe_ids
+        self.client.post(f'/api/recipes/{first}/favorite/')
+        response = self.client.post(
+            '/api/recipes/favorite/', {'recipes': [first, 0]}, format='json'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        with self.assertNumQueries(7):
+            response = self.client.post(
+                '/api/recipes/favorite/',
+                {'recipes': [first, second, 10 ** 6]}, format='json'
+            )
+        self.assertEqual(
+            [row['status'] for row in response.data],
+            ['exists', 'added', 'not_found']
+        )
+        response = self.client.delete(
+            '/api/recipes/favorite/',
+            {'recipes': [second, third]}, format='json'
+        )
+        self.assertEqual(
+            [row['status'] for row in response.data],
+            ['removed', 'not_in_list']
+        )
+        self.assertEqual(
+            list(Favorite.objects.values_list('recipe_id', flat=True)),
+            [first]
+        )
+
+    def test_repeated_single_requests_keep_counters(self):
+        """Повторное добавление и удаление не меняют счётчик дважды."""
+        recipe_id = self.recipe_ids[0]
+        url = f'/api/recipes/{recipe_id}/favorite/'
+        self.assertEqual(self.client.post(url).status_code,
+                         HTTPStatus.CREATED)
+        self.assertEqual(self.client.post(url).status_code,
+                         HTTPStatus.BAD_REQUEST)
+        self.assertEqual(
+            Recipe.objects.get(id=recipe_id).favorites_count, 1
+        )
+        self.assertEqual(self.client.delete(url).status_code,
+                         HTTPStatus.NO_CONTENT)
+        self.assertEqual(self.client.delete(url).status_code,
+                         HTTPStatus.BAD_REQUEST)
+        self.assertEqual(
+            Recipe.objects.get(id=recipe_id).favorites_count, 0
+        )
+
+    def test_batch_shopping_cart_updates_totals(self):
+        """Пакетное добавление в корзину обновляет суммы Ингредиентов."""
+        with self.assertNumQueries(11):
+            self.client.post(
+                '/api/recipes/shopping_cart/',
+                {'recipes': self.recipe_ids}, format='json'
+            )
+        self.assertEqual(
+            self.user.cart_ingredients.get().total_amount, 300
+        )
+        self.client.delete(
+            '/api/recipes/shopping_cart/',
+            {'recipes': self.recipe_ids[:2]}, format='json'
+        )
+        self.assertEqual(
+            self.user.cart_ingredients.get().total_amount, 100
+        )
+        self.assertEqual(
+            list(Recipe.objects.order_by('id').values_list(
+                'in_carts_count', flat=True
+            )),
+            [0, 0, 1]
+        )
+
+
+class SubscriptionsListTestCase(TestCase):
+    """Тесты списка подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Читатель', last_name='Подписок', password='pass'
+        )
+        for number in range(4):
+            author = User.objects.create_user(
+                email=f'author{number}@foodgram.ru',
+                username=f'author{number}',
+                first_name='Автор', last_name='Рецептов', password='pass'
+            )
+            for recipe_number in range(3):
+                create_recipe(author, f'Рецепт {recipe_number}')
+            Subscribe.objects.create(user=cls.user, subscribing=author)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_queries_do_not_depend_on_page_size(self):
+        """Число запросов к подпискам не зависит от размера страницы."""
+        for limit in (2, 4):
+            with self.assertNumQueries(3):
+                response = self.client.get(
+                    '/api/users/subscriptions/',
+                    {'limit': limit, 'recipes_limit': 2}
+                )
+            self.assertEqual(len(response.data['results']), limit)
+        author = response.data['results'][0]
+        self.assertEqual(len(author['recipes']), 2)
+        self.assertEqual(author['recipes_count'], 3)
+        self.assertTrue(author['is_subscribed'])
+
+    def test_invalid_recipes_limit(self):
+        """Некорректный recipes_limit отклоняется."""
+        response = self.client.get(
+            '/api/users/subscriptions/', {'recipes_limit': 'all'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_users_list_loads_subscriptions_once(self):
+        """Подписки для списка Пользователей загружаются одним запросом."""
+        for limit in (2, 5):
+            with self.assertNumQueries(3):
+                response = self.client.get('/api/users/', {'limit': limit})
+        self.assertEqual(
+            {user['username']: user['is_subscribed']
+             for user in response.data['results']},
+            {'reader': False, 'author0': True, 'author1': True,
+             'author2': True, 'author3': True}
+        )
+
+    def test_counters_follow_subscriptions_and_reconcile(self):
+        """Счётчик подписчиков меняется при подписке и сверяется командой."""
+        author = User.objects.get(username='author0')
+        self.client.delete(f'/api/users/{author.id}/subscribe/')
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 0)
+        output = StringIO()
+        call_command('reconcile_counters', stdout=output)
+        self.assertIn('foodgramuser.followers_count: расхождений 3.',
+                      output.getvalue())
+        self.assertEqual(
+            User.objects.get(username='author1').followers_count, 1
+        )
+
+
+class ShortLinkTestCase(TestCase):
+    """Тесты коротких ссылок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='linker@foodgram.ru', username='linker',
+            first_name='Автор', last_name='Ссылок', password='pass'
+        )
+
+    def setUp(self):
+        """Отдельный буфер переходов без сброса по времени."""
+        self.clicks = ClickBuffer(CLICK_BUFFER_MAX_SIZE, 3600)
+        patcher = mock.patch('api.views.clicks', self.clicks)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_code_is_base62_of_id_and_redirect_is_cached(self):
+        """Код выводится из id, повторный переход не обращается к базе."""
+        self.assertEqual(ShortLinkRecipe.encode(62 ** 2 + 61), '10Z')
+        recipe = create_recipe(self.author)
+        code = ShortLinkRecipe.encode(recipe.pk)
+        link = self.client.get(
+            f'/api/recipes/{recipe.pk}/get-link/'
+        ).json()['short-link']
+        self.assertTrue(link.endswith(f'/s/{code}/'))
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/s/{code}/')
+        self.assertRedirects(
+            response, f'http://testserver/recipes/{recipe.pk}/',
+            fetch_redirect_response=False
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        self.assertEqual(
+            self.client.get(f'/s/{code}/').status_code, HTTPStatus.NOT_FOUND
+        )
+
+    def test_deleted_links_are_dropped_by_other_processes(self):
+        """Кэш другого процесса забывает ссылку удалённого Рецепта."""
+        recipe = create_recipe(self.author)
+        code = ShortLinkRecipe.encode(recipe.pk)
+        other_process = ShortLinkCache(SHORT_LINK_CACHE_SIZE)
+        self.assertEqual(other_process.get_recipe_id(code), recipe.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        self.assertIsNone(other_process.get_recipe_id(code))
+
+    def test_clicks_are_buffered_and_shown_to_author(self):
+        """Переходы копятся в буфере и записываются одним запросом."""
+        recipe = create_recipe(self.author)
+        code = ShortLinkRecipe.encode(recipe.pk)
+        for _ in range(3):
+            self.client.get(f'/s/{code}/')
+        self.assertEqual(self.clicks.get_pending(code), 3)
+        with self.assertNumQueries(1):
+            self.clicks.flush()
+        self.assertEqual(
+            ShortLinkRecipe.objects.get(recipe=recipe).clicks, 3
+        )
+        self.client.get(f'/s/{code}/')
+        client = APIClient()
+        client.force_authenticate(self.author)
+        url = f'/api/recipes/{recipe.pk}/link-stats/'
+        self.assertEqual(client.get(url).data['clicks'], 4)
+        self.assertEqual(self.clicks.get_pending(code), 0)
+        self.assertEqual(
+            self.client.get(url).status_code, HTTPStatus.UNAUTHORIZED
+        )
+        self.assertEqual(
+            client.get('/api/recipes/abc/link-stats/').status_code,
+            HTTPStatus.NOT_FOUND
+        )
+
+
+class ImageRenditionsTestCase(TestCase):
+    """Тесты вариантов изображений Рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='photo@foodgram.ru', username='photo',
+            first_name='Фото', last_name='Граф', password='pass'
+        )
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        buffer = BytesIO()
+        Image.new('RGB', (2000, 1000), 'red').save(buffer, 'PNG')
+        self.recipe = create_recipe(self.author)
+        self.recipe.image.save('photo.png', ContentFile(buffer.getvalue()))
+
+    def test_backfill_creates_renditions(self):
+        """Команда создаёт варианты, ссылки выводятся по запросу.
+
+        Дата изменения Рецепта при этом не меняется.
+        """
+        updated_at = Recipe.objects.get(pk=self.recipe.pk).updated_at
+        call_command('create_renditions', stdout=StringIO())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.updated_at, updated_at)
+        renditions = self.recipe.image_renditions
+        self.assertEqual(
+            set(renditions), {'thumbnail', 'thumbnail_webp', 'webp'}
+        )
+        with self.recipe.image.storage.open(renditions['webp']) as file:
+            self.assertEqual(Image.open(file).size, (1280, 640))
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.assertNotIn('image_renditions', self.client.get(url).json())
+        response = self.client.get(url, {'renditions': 1}).json()
+        self.assertIn(
+            '/media/recipes/images/renditions/',
+            response['image_renditions']['thumbnail']
+        )
+
+    def test_renditions_of_replaced_image_are_discarded(self):
+        """Варианты старого изображения не записываются в Рецепт."""
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            image='recipes/images/other.png'
+        )
+        renditions = create_renditions(self.recipe)
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.pk).image_renditions, {}
+        )
+        storage = self.recipe.image.storage
+        self.assertFalse(any(
+            storage.exists(name) for name in renditions.values()
+        ))
+
+    def test_renditions_are_scheduled_after_commit(self):
+        """Создание вариантов ставится в пул после фиксации транзакции."""
+        with mock.patch('recipes.renditions.executor') as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                schedule_renditions(self.recipe.id)
+        executor.submit.assert_called_once_with(
+            create_renditions_in_background, self.recipe.id
+        )
+
+
+class ContentAddressedStorageTestCase(TestCase):
+    """Тесты хранилища медиафайлов с адресацией по содержимому."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.storage = ContentAddressedStorage(location=media_root.name)
+
+    def test_identical_uploads_share_one_reference_counted_file(self):
+        """Одинаковые загрузки — один файл, удаляемый с последней ссылкой."""
+        names = [
+            self.storage.save('recipes/images/temp.png', ContentFile(b'x'))
+            for _ in range(2)
+        ]
+        digest = hashlib.sha256(b'x').hexdigest()
+        self.assertEqual(
+            names, [f'recipes/images/{digest[:2]}/{digest}.png'] * 2
+        )
+        self.storage.delete(names[0])
+        self.assertTrue(self.storage.exists(names[0]))
+        self.storage.delete(names[0])
+        self.assertFalse(self.storage.exists(names[0]))
+        self.assertFalse(StoredFile.objects.exists())
+
+
+class ImageUploadTestCase(TestCase):
+    """Тесты загрузки изображений по частям."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='upload@foodgram.ru', username='upload',
+            first_name='За', last_name='Грузка', password='pass'
+        )
+
+    def setUp(self):
+        for name in ('MEDIA_ROOT', 'UPLOAD_TEMP_DIR'):
+            directory = tempfile.TemporaryDirectory()
+            self.addCleanup(directory.cleanup)
+            settings = override_settings(**{name: directory.name})
+            settings.enable()
+            self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        buffer = BytesIO()
+        Image.new('RGB', (40, 40), 'blue').save(buffer, 'PNG')
+        self.image = buffer.getvalue()
+
+    def send(self, token, chunk, offset):
+        return self.client.generic(
+            'PATCH', f'/api/uploads/{token}/', chunk,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def upload(self, content):
+        token = self.client.post(
+            '/api/uploads/', {'size': len(content)}, format='json'
+        ).json()['token']
+        middle = len(content) // 2
+        self.send(token, content[:middle], 0)
+        response = self.send(token, content[middle:], middle)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.json()['completed'])
+        return token
+
+    def test_upload_resumes_from_confirmed_offset(self):
+        """Часть с неверным смещением отклоняется с текущим смещением."""
+        token = self.client.post(
+            '/api/uploads/', {'size': len(self.image)}, format='json'
+        ).json()['token']
+        response = self.send(token, self.image[:20], 0)
+        self.assertEqual(response.json()['offset'], 20)
+        response = self.send(token, self.image[20:], 0)
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT)
+        self.assertEqual(response['Upload-Offset'], '20')
+        response = self.send(token, self.image[20:], 20)
+        self.assertEqual(response.json()['offset'], len(self.image))
+        self.assertEqual(
+            self.client.get(f'/api/uploads/{token}/').json()['completed'],
+            True
+        )
+
+    def test_completed_upload_is_used_by_token(self):
+        """Токен готовой загрузки принимается вместо base64."""
+        token = self.upload(self.image)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                '/api/users/me/avatar/', {'avatar': token}, format='json'
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.user.refresh_from_db()
+        with self.user.avatar.open() as file:
+            self.assertEqual(file.read(), self.image)
+        self.assertFalse(ImageUpload.objects.filter(token=token).exists())
+        response = self.client.put(
+            '/api/users/me/avatar/', {'avatar': token}, format='json'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_deduplicated_upload_is_discarded(self):
+        """Загрузка уже сохранённого содержимого удаляется вместе с файлом."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(
+                '/api/users/me/avatar/',
+                {'avatar': self.upload(self.image)},
+                format='json'
+            )
+        upload = ImageUpload.objects.get(token=self.upload(self.image))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                '/api/users/me/avatar/',
+                {'avatar': upload.token},
+                format='json'
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(ImageUpload.objects.exists())
+        self.assertFalse(os.listdir(os.path.dirname(upload.path)))
+
+    def test_concurrent_chunk_is_rejected(self):
+        """Из двух частей с одним смещением принимается одна."""
+        token = self.client.post(
+            '/api/uploads/', {'size': len(self.image)}, format='json'
+        ).json()['token']
+        write_chunk = api_views.write_chunk
+
+        def write_after_other(upload, stream):
+            with mock.patch('api.views.write_chunk', write_chunk):
+                self.assertEqual(
+                    self.send(token, self.image[:20], 0).status_code,
+                    HTTPStatus.OK
+                )
+            return write_chunk(upload, stream)
+
+        with mock.patch('api.views.write_chunk', write_after_other):
+            response = self.send(token, self.image[:30], 0)
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT)
+        self.assertEqual(response['Upload-Offset'], '20')
+        upload = ImageUpload.objects.get(token=token)
+        self.assertEqual(os.path.getsize(upload.path), 20)
+        self.assertEqual(os.listdir(os.path.dirname(upload.path)),
+                         [os.path.basename(upload.path)])
+
+    def test_open_uploads_are_limited(self):
+        """Число открытых загрузок Пользователя ограничено."""
+        for _ in range(UPLOAD_MAX_OPEN_PER_USER):
+            self.client.post('/api/uploads/', {'size': 10}, format='json')
+        response = self.client.post(
+            '/api/uploads/', {'size': 10}, format='json'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_non_image_upload_is_rejected(self):
+        """Загрузка без сигнатуры изображения удаляется."""
+        token = self.client.post(
+            '/api/uploads/', {'size': 100}, format='json'
+        ).json()['token']
+        response = self.send(token, b'#!/bin/sh\necho hello\n', 0)
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertFalse(ImageUpload.objects.filter(token=token).exists())
+
+
+class RecipeWriteTestCase(TestCase):
+    """Тесты записи Рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='writer@foodgram.ru', username='writer',
+            first_name='Автор', last_name='Писатель', password='pass'
+        )
+        cls.ingredients = list(Ingredient.objects.all()[:3])
+        cls.tags = list(Tag.objects.all()[:2])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        self.recipe = create_recipe(self.author)
+        self.recipe.tags.set(self.tags[:1])
+        self.recipe.recipe_ingredient.all().delete()
+        self.rows = [
+            RecipeIngredient.objects.create(
+                recipe=self.recipe, ingredient=ingredient, amount=10
+            )
+            for ingredient in self.ingredients[:2]
+        ]
+
+    def update_recipe(self):
+        return self.client.patch(
+            f'/api/recipes/{self.recipe.id}/', {
+                'ingredients': [
+                    {'id': self.ingredients[0].id, 'amount': 10},
+                    {'id': self.ingredients[2].id, 'amount': 5},
+                ],
+                'tags': [tag.id for tag in self.tags[1:]],
+                'name': 'Новое название',
+                'text': 'Описание',
+                'cooking_time': 5,
+            }, format='json'
+        )
+
+    def test_update_changes_only_differing_rows(self):
+        """Изменяются только отличающиеся строки в пределах бюджета.
+
+        Три запроса загружают Рецепт, два проверяют id, одиннадцать
+        блокируют Рецепт и записывают изменения и версию Рецептов
+        в транзакции, три формируют ответ.
+        """
+        with self.assertNumQueries(19):
+            response = self.update_recipe()
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            sorted(
+                (row['id'], row['amount'])
+                for row in response.json()['ingredients']
+            ),
+            sorted([(self.ingredients[0].id, 10), (self.ingredients[2].id, 5)])
+        )
+        self.assertEqual(
+            [tag['id'] for tag in response.json()['tags']], [self.tags[1].id]
+        )
+        self.assertTrue(
+            RecipeIngredient.objects.filter(pk=self.rows[0].pk).exists()
+        )
+        self.assertFalse(
+            RecipeIngredient.objects.filter(pk=self.rows[1].pk).exists()
+        )
+
+    def test_failed_update_is_rolled_back(self):
+        """Ошибка посреди записи не оставляет Рецепт без Ингредиентов."""
+        with mock.patch.object(
+            Recipe, 'set_tags', side_effect=DatabaseError
+        ), self.assertRaises(DatabaseError):
+            self.update_recipe()
+        self.assertEqual(
+            set(self.recipe.recipe_ingredient.values_list('pk', flat=True)),
+            {row.pk for row in self.rows}
+        )
+
+
+class RecipeTransferTestCase(TestCase):
+    """Тесты выгрузки и загрузки Рецептов в NDJSON."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='source@foodgram.ru', username='source',
+            first_name='Исходный', last_name='Автор', password='pass'
+        )
+        cls.importer = User.objects.create_user(
+            email='target@foodgram.ru', username='target',
+            first_name='Новый', last_name='Автор', password='pass'
+        )
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings = override_settings(
+            MEDIA_ROOT=media_root.name, UPLOAD_TEMP_DIR=media_root.name
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.importer)
+        for name in ('Первый', 'Второй'):
+            recipe = create_recipe(self.author, name=name)
+            recipe.image.save('photo.png', ContentFile(b'image'))
+
+    def export(self):
+        response = self.client.get('/api/recipes/export/')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return b''.join(response.streaming_content)
+
+    def test_export_import_round_trip(self):
+        """Выгруженные Рецепты загружаются от имени Пользователя."""
+        lines = self.export().splitlines()
+        self.assertEqual(len(lines), 2)
+        after = json.loads(lines[0])['id']
+        response = self.client.get('/api/recipes/export/', {'after': after})
+        self.assertEqual(b''.join(response.streaming_content).strip(),
+                         lines[1])
+        with mock.patch('recipes.renditions.executor') as executor, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.generic(
+                'POST', '/api/recipes/import/',
+                b'\n'.join(lines + [b'{"name": ""}']),
+                content_type='application/x-ndjson'
+            )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        report = response.json()
+        self.assertEqual((report['lines'], report['imported']), (3, 2))
+        self.assertEqual(report['errors'][0]['line'], 3)
+        imported = Recipe.objects.filter(author=self.importer)
+        self.assertEqual(imported.count(), 2)
+        self.assertEqual(
+            sorted(call.args[1] for call in executor.submit.call_args_list),
+            sorted(imported.values_list('id', flat=True))
+        )
+        self.importer.refresh_from_db()
+        self.assertEqual(self.importer.recipes_count, 2)
+        recipe = imported.get(name='Первый')
+        self.assertEqual(recipe.recipe_ingredient.count(), 1)
+        self.assertEqual(recipe.tags.count(), 1)
+        self.assertTrue(ShortLinkRecipe.objects.filter(recipe=recipe).exists())
+        self.assertEqual(
+            StoredFile.objects.get(name=recipe.image.name).references, 4
+        )
+
+    def test_import_endpoint_checks_images_and_ingredients(self):
+        """По API нельзя сослаться на неучтённый файл и пополнить справочник.
+
+        Изображение можно передать токеном завершённой загрузки.
+        """
+        record = json.loads(self.export().splitlines()[0])
+        with open(os.path.join(self.media_root, 'recipes/images/old.png'),
+                  'wb') as file:
+            file.write(b'untracked')
+        upload = ImageUpload.objects.create(
+            token='token', user=self.importer, size=5, offset=5,
+            extension='png'
+        )
+        with open(upload.path, 'wb') as file:
+            file.write(b'photo')
+        ingredients_count = Ingredient.objects.count()
+        lines = [
+            {**record, 'image': 'recipes/images/old.png'},
+            {**record, 'ingredients': [{
+                'name': 'Новый', 'measurement_unit': 'г', 'amount': 1
+            }]},
+            {**record, 'image': 'token'},
+        ]
+        with mock.patch('recipes.renditions.executor'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.generic(
+                'POST', '/api/recipes/import/',
+                '\n'.join(json.dumps(line) for line in lines),
+                content_type='application/x-ndjson'
+            )
+        report = response.json()
+        self.assertEqual(report['imported'], 1)
+        self.assertEqual([error['line'] for error in report['errors']],
+                         [1, 2])
+        self.assertEqual(Ingredient.objects.count(), ingredients_count)
+        self.assertFalse(StoredFile.objects.filter(
+            name='recipes/images/old.png'
+        ).exists())
+        recipe = Recipe.objects.get(author=self.importer)
+        self.assertEqual(
+            StoredFile.objects.get(name=recipe.image.name).references, 1
+        )
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_import_reports_unsafe_image_path(self):
+        """Путь за пределами хранилища — ошибка строки, а не всей загрузки."""
+        record = json.loads(self.export().splitlines()[0])
+        importer = RecipeImporter(self.importer)
+        for _ in importer.run([json.dumps(
+            {**record, 'image': '../../etc/passwd'}
+        )]):
+            pass
+        self.assertEqual(importer.errors, [
+            {'line': 1, 'error': 'Недопустимый путь к изображению.'}
+        ])
+
+    def test_import_command_resumes_after_failure(self):
+        """После сбоя загрузка продолжается с указанной строки."""
+        path = tempfile.NamedTemporaryFile(suffix='.ndjson', delete=False)
+        self.addCleanup(path.close)
+        path.write(self.export())
+        path.flush()
+        import_batch = RecipeImporter.import_batch
+        calls = iter([None, DatabaseError('сбой')])
+
+        def fail_second(importer, records):
+            error = next(calls)
+            if error:
+                raise error
+            return import_batch(importer, records)
+
+        with mock.patch.object(RecipeImporter, 'import_batch', fail_second):
+            with self.assertRaisesMessage(CommandError, '--skip 1'):
+                call_command(
+                    'import_recipes', path.name, '--batch-size', '1',
+                    '--author', self.importer.email, stdout=StringIO()
+                )
+        call_command(
+            'import_recipes', path.name, '--skip', '1',
+            '--author', self.importer.email, stdout=StringIO()
+        )
+        self.assertEqual(
+            list(Recipe.objects.filter(
+                author=self.importer
+            ).order_by('id').values_list('name', flat=True)),
+            ['Первый', 'Второй']
+        )
+
+
+class AsyncReadViewsTestCase(TestCase):
+    """Тесты асинхронного чтения в режиме ASGI."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='async@foodgram.ru', username='async',
+            first_name='Асинхронный', last_name='Автор', password='pass'
+        )
+        cls.recipe = create_recipe(cls.author)
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.invalidate()
+        ingredient_index.refresh()
+        self.urls = {
+            url.name: url.callback
+            for url in get_async_urls(api_router.urls)
+        }
+
+    async def get(self, name, path, **kwargs):
+        return await self.urls[name](
+            AsyncRequestFactory().get(path, **kwargs), **(
+                {'pk': path.strip('/').split('/')[-1]}
+                if name.endswith('detail') else {}
+            )
+        )
+
+    async def test_catalogs_match_sync_views(self):
+        """Ответы справочников совпадают с ответами вьюсетов."""
+        for name, path in (('tags-list', '/api/tags/'),
+                           ('ingredients-list', '/api/ingredients/?name=с'),
+                           ('tags-detail', '/api/tags/1/'),
+                           ('tags-detail', '/api/tags/0/')):
+            response = await self.get(name, path)
+            expected = await sync_to_async(self.client.get)(path)
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(json.loads(response.content), expected.json())
+            if response.status_code == HTTPStatus.OK:
+                self.assertEqual(response['ETag'], expected['ETag'])
+        etag = (await self.get('tags-list', '/api/tags/'))['ETag']
+        response = await self.get(
+            'tags-list', '/api/tags/', headers={'If-None-Match': etag}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_async_cache_keys_match_sync_keys(self):
+        """Корутины строят те же ключи кэша, что и вьюсеты."""
+        request = RequestFactory().get('/api/recipes/?limit=2&renditions=1')
+        self.assertEqual(async_to_sync(aget_list_key)(request),
+                         get_list_key(request))
+        self.assertEqual(
+            async_to_sync(aget_detail_key)(request, self.recipe.id),
+            get_detail_key(request, self.recipe.id)
+        )
+
+    def test_cached_recipe_is_served_without_database(self):
+        """Закэшированный анонимный ответ отдаётся без запросов к БД."""
+        path = f'/api/recipes/{self.recipe.id}/'
+        first = async_to_sync(self.get)('recipes-detail', path)
+        self.assertEqual(first.status_code, HTTPStatus.OK)
+        with self.assertNumQueries(0):
+            second = async_to_sync(self.get)('recipes-detail', path)
+        self.assertEqual(json.loads(second.content), first.data)
+
+
+class ReplicaRouterTestCase(TestCase):
+    """Тесты чтения из реплик с закреплением за основной базой."""
+
+    def setUp(self):
+        cache.clear()
+        settings = override_settings(DATABASE_REPLICAS=['replica'])
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.factory = RequestFactory()
+
+    def route(self, request):
+        """Алиас базы для чтения и ответ вложенного обработчика."""
+        used = []
+
+        def get_response(request):
+            used.append(router.db_for_read(Recipe))
+            return HttpResponse(status=HTTPStatus.CREATED)
+
+        response = ReplicaRoutingMiddleware(get_response)(request)
+        return used[0], response
+
+    @override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'])
+    def test_request_reads_from_one_replica(self):
+        """Все чтения запроса идут в одну реплику, кроме общих кэшей."""
+        for _ in range(10):
+            used = []
+
+            def get_response(request):
+                used.extend(router.db_for_read(Recipe) for _ in range(5))
+                with read_from_primary():
+                    used.append(router.db_for_read(Recipe))
+                return HttpResponse()
+
+            ReplicaRoutingMiddleware(get_response)(
+                self.factory.get('/api/recipes/')
+            )
+            self.assertEqual(len(set(used[:5])), 1)
+            self.assertEqual(used[5], 'default')
+
+    def test_reads_stick_to_primary_after_write(self):
+        """После записи чтение идёт в основную базу по cookie."""
+        self.assertEqual(self.route(self.factory.get('/api/recipes/'))[0],
+                         'replica')
+        alias, response = self.route(self.factory.post('/api/recipes/'))
+        self.assertEqual(alias, 'default')
+        cookie = response.cookies[REPLICA_PIN_COOKIE].value
+        request = self.factory.get('/api/recipes/1/')
+        request.COOKIES[REPLICA_PIN_COOKIE] = cookie
+        self.assertEqual(self.route(request)[0], 'default')
+        request.COOKIES[REPLICA_PIN_COOKIE] = '0'
+        self.assertEqual(self.route(request)[0], 'replica')
+
+    def test_token_clients_stick_without_cookie(self):
+        """Клиент с токеном закрепляется через кэш."""
+        headers = {'HTTP_AUTHORIZATION': 'Token writer'}
+        self.route(self.factory.post('/api/recipes/', **headers))
+        self.assertEqual(
+            self.route(self.factory.get('/api/recipes/', **headers))[0],
+            'default'
+        )
+        self.assertEqual(
+            self.route(self.factory.get(
+                '/api/recipes/', HTTP_AUTHORIZATION='Token reader'
+            ))[0],
+            'replica'
+        )
+        self.assertEqual(router.db_for_read(Recipe), 'default')
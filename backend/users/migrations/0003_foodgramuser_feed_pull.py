@@ -0,0 +1,35 @@
+# Generated by Django 4.2.16 on 2026-10-18 07:02
+
+from django.db import migrations, models
+from django.db.models import Count
+
+from recipes.constants import FEED_FANOUT_MAX_SUBSCRIBERS
+
+
+def set_feed_pull(apps, schema_editor):
+    """Включает режим чтения для авторов с большим числом подписчиков."""
+    Subscribe = apps.get_model('users', 'Subscribe')
+    FoodgramUser = apps.get_model('users', 'FoodgramUser')
+    FoodgramUser.objects.filter(id__in=Subscribe.objects.values(
+        'subscribing'
+    ).annotate(
+        subscribers_count=Count('id')
+    ).filter(
+        subscribers_count__gt=FEED_FANOUT_MAX_SUBSCRIBERS
+    ).values('subscribing')).update(feed_pull=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodgramuser',
+            name='feed_pull',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Рецепты подмешиваются в ленты при чтении'),
+        ),
+        migrations.RunPython(set_feed_pull, migrations.RunPython.noop),
+    ]
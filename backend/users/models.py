@@ -9,16 +9,26 @@ class FoodgramUser(AbstractUser):
         blank=True
     )
     email = models.EmailField(unique=True)
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число подписчиков'
+    )
+    feed_pull = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Рецепты подмешиваются в ленты при чтении'
+    )
 
     USERNAME_FIELD = 'email'
     EMAIL_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
-    @property
-    def is_subscribed(self):
-        """Возвращает True, если пользователь подписан на этого автора."""
-        return self.subscribtions.filter(subscribing=self).exists()
-
 
 class Subscribe(models.Model):
     """Модель подписки на пользователя."""